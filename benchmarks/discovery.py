@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Times zeek-log-query.py's file discovery over a synthetic archive of empty files.
+
+The archive is laid out like Zeek's: --days YYYY-MM-DD directories of --files-per-day hourly
+logs each (1,000 x 1,000 by default, the README's 1M-file benchmark). It's created under
+--root on first use and reused afterwards. Each --walk-workers value is run --runs times with
+a pattern that matches nothing, so the whole tree is walked and nothing else is read, and the
+median of the discovery times zeek-log-query.py reports is printed.
+
+Example: python3 benchmarks/discovery.py --root /tmp/zeek-walk-1m --walk-workers 1 4 16
+"""
+import argparse
+import datetime
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'zeek-log-query.py')
+LOG_TYPES = ['conn', 'dns', 'http', 'ssl', 'files', 'weird', 'notice', 'x509', 'dhcp', 'ntp',
+             'smtp', 'ssh', 'software', 'known_hosts', 'capture_loss', 'stats', 'reporter',
+             'dpd', 'tunnel', 'sip', 'snmp', 'ftp', 'rdp', 'kerberos', 'ntlm', 'smb_files',
+             'smb_mapping', 'dce_rpc', 'pe', 'ocsp', 'radius', 'mysql', 'modbus', 'irc',
+             'syslog', 'socks', 'known_services', 'known_certs', 'loaded_scripts', 'packet_filter',
+             'signatures', 'traceroute']
+DISCOVERY_RE = re.compile(r'Discovered [\d,]+ matching files in ([\d.]+)s')
+
+parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+parser.add_argument('--root', default='zeek-walk-bench', help="Directory holding the synthetic archive (default: %(default)s)")
+parser.add_argument('--days', type=int, default=1000, help="Number of day directories (default: %(default)s)")
+parser.add_argument('--files-per-day', type=int, default=1000, help="Number of files per day directory (default: %(default)s)")
+parser.add_argument('--walk-workers', type=int, nargs='+', default=[1, 4, 16], help="--walk-workers values to time (default: 1 4 16)")
+parser.add_argument('--runs', type=int, default=5, help="Runs per value; the median is reported (default: %(default)s)")
+parser.add_argument('--pattern', default=r'nomatch\.log$', help="File regex to discover with (default: %(default)s)")
+parser.add_argument('--script', default=SCRIPT, help="zeek-log-query.py to time, e.g. an older checkout (default: this one)")
+opts = parser.parse_args()
+
+def create_archive():
+    """Creates the synthetic archive under opts.root, unless a complete one is already there."""
+    marker = os.path.join(opts.root, f".complete-{opts.days}x{opts.files_per_day}")
+    if os.path.exists(marker):
+        return
+    print(f"[*] Creating {opts.days * opts.files_per_day:,} empty files under {opts.root}", file=sys.stderr)
+    start = datetime.date(2022, 1, 1)
+    for day in range(opts.days):
+        day_path = os.path.join(opts.root, (start + datetime.timedelta(days=day)).isoformat())
+        os.makedirs(day_path, exist_ok=True)
+        for i in range(opts.files_per_day):
+            hour = i % 24
+            name = f"{LOG_TYPES[i // 24 % len(LOG_TYPES)]}.{hour:02d}:00:00-{(hour + 1) % 24:02d}:00:00.log.gz"
+            if i >= 24 * len(LOG_TYPES):
+                name = f"extra{i}.{name}"
+            open(os.path.join(day_path, name), 'wb').close()
+    open(marker, 'wb').close()
+
+def time_discovery(walk_workers):
+    """Runs one discovery, returning the time zeek-log-query.py reports for it."""
+    result = subprocess.run([sys.executable, opts.script, '--no-metadata-cache', '--walk-workers', str(walk_workers),
+                             opts.pattern, 'SELECT 1'], cwd=opts.root, capture_output=True, text=True)
+    match = DISCOVERY_RE.search(result.stderr)
+    if not match:
+        sys.exit(f"[!] Error: no discovery time in the output of {opts.script}:\n{result.stderr}")
+    return float(match.group(1))
+
+create_archive()
+time_discovery(opts.walk_workers[0])  # Warm the directory cache
+print("walk_workers\tmedian_s\tmin_s\tmax_s")
+for walk_workers in opts.walk_workers:
+    times = [time_discovery(walk_workers) for _ in range(opts.runs)]
+    print(f"{walk_workers}\t{statistics.median(times):.3f}\t{min(times):.3f}\t{max(times):.3f}")
@@ -1,105 +1,1463 @@
 import duckdb
+import argparse
+import bz2
+import datetime
+import email.utils
 import gzip
+import hashlib
+import hmac
+import http.client
+import io
+import json
+import lzma
 import re
 import os
 import sys
+import tarfile
+import threading
 import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ElementTree
+import zipfile
+import zlib
 import ipaddress
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional dependencies: zstd header reads (otherwise done through DuckDB), lz4 archives, and
+# the fsspec filesystem that streams codecs DuckDB can't decompress itself, and tar/zip
+# members, into read_csv
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+try:
+    import fsspec
+except ImportError:
+    fsspec = None
 
 # 1. Start Global Timer
 start_total = time.perf_counter()
 
-if len(sys.argv) < 3:
-    script_name = sys.argv[0]
-    print(f"Usage: python3 {script_name} <file_regex> [<file_regex> ...] <sql_query>")
-    print(f"Example: python3 {script_name} '.*\\.log\\.gz$' 'SELECT * FROM conn LIMIT 10'")
-    print(f"Example: python3 {script_name} 'conn.*\\.gz$' 'http.*\\.gz$' 'SELECT * FROM conn'")
+def parse_time_arg(value):
+    """Parses an epoch number or ISO 8601 date/time (naive values are local time, like Zeek's archive names)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time {value!r} (use epoch seconds or YYYY-MM-DD[THH:MM[:SS]])")
+
+script_name = sys.argv[0]
+parser = argparse.ArgumentParser(
+    usage=(f"python3 {script_name} [options] <file_regex> [<file_regex> ...] <sql_query>\n"
+           f"       python3 {script_name} [options] --files-from PATH [<file_regex> ...] <sql_query>\n"
+           f"       <command> | python3 {script_name} [options] --stdin [<file_regex> ...] <sql_query>"),
+    epilog=(f"Example: python3 {script_name} '.*\\.log\\.gz$' 'SELECT * FROM conn LIMIT 10'\n"
+            f"Example: python3 {script_name} 'conn.*\\.gz$' 'http.*\\.gz$' 'SELECT * FROM conn'"),
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+)
+parser.add_argument('args', nargs='*', metavar='file_regex ... sql_query',
+                    help="File regex patterns followed by the SQL query (must be last)")
+parser.add_argument('--scan-workers', type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                    help="Number of threads used to read file headers (default: %(default)s, 1 = sequential)")
+parser.add_argument('--files-from', metavar='PATH',
+                    help="Read newline- or NUL-separated file paths from PATH ('-' for stdin) instead of walking "
+                         "directories; file regexes become optional filters")
+parser.add_argument('--stdin', action='store_true',
+                    help="Also read one Zeek TSV log stream (possibly several concatenated logs) from standard input, "
+                         "listed as file '-'; file regexes become optional")
+parser.add_argument('--s3-endpoint', default=os.environ.get('AWS_ENDPOINT_URL_S3') or os.environ.get('AWS_ENDPOINT_URL'),
+                    help="Endpoint URL of an S3-compatible object store for s3://bucket/... patterns, e.g. "
+                         "http://localhost:9000 (default: $AWS_ENDPOINT_URL_S3 or $AWS_ENDPOINT_URL, else AWS S3)")
+parser.add_argument('--walk-workers', type=int, default=1,
+                    help="Number of threads listing directories and S3 prefixes during file discovery (default: %(default)s = "
+                         "sequential); more help on network filesystems and S3, where each listing waits on a round trip")
+parser.add_argument('--tolerant', action='store_true',
+                    help="Skip malformed rows instead of failing the query; skipped rows are counted per file and log type")
+parser.add_argument('--sample-headers', action='store_true',
+                    help="Read one header per (directory, log name prefix) group and assume the other files match; "
+                         "assumptions are verified during the query scan and mismatching groups re-planned")
+parser.add_argument('--since', type=parse_time_arg, metavar='TIME',
+                    help="Only read logs overlapping times at or after TIME (epoch or ISO 8601, local time unless an offset is given)")
+parser.add_argument('--until', type=parse_time_arg, metavar='TIME',
+                    help="Only read logs overlapping times before TIME")
+parser.add_argument('--epoch-times', action='store_true',
+                    help="Expose time and interval fields as DOUBLE seconds, as older versions did, instead of TIMESTAMP/INTERVAL")
+parser.add_argument('--compact-types', action='store_true',
+                    help="Use UBIGINT for counts, USMALLINT for ports and ENUM types for low-cardinality enum fields "
+                         "(costs one extra pass to collect enum values)")
+parser.add_argument('--ip-ints', action='store_true',
+                    help="Add <field>_int (UHUGEINT) and <field>_family columns for each addr field and rewrite "
+                         "INET equality and <<=/>>= CIDR predicates on addr fields into integer range comparisons")
+parser.add_argument('--files-where', metavar='EXPR',
+                    help="Only read files for which EXPR, a SQL condition on the log_files table columns, is true")
+parser.add_argument('--parquet-cache', metavar='DIR',
+                    help="Convert each file to zstd Parquet sorted by ts under DIR/<log type>/date=YYYY-MM-DD/ on first "
+                         "use, and read the Parquet copy while the source is unchanged")
+parser.add_argument('--compact', action='store_true',
+                    help="With --parquet-cache, merge each day's cached files of a log type into one Parquet file "
+                         "sorted by ts, which the views read in place of the per-file copies")
+parser.add_argument('--z-order', action='store_true',
+                    help="With --compact, order compacted files along a Z-order curve of ts and id.orig_h instead "
+                         "of by ts alone, so rows of one source host share fewer row groups")
+parser.add_argument('--db', metavar='PATH',
+                    help="Keep the logs in a DuckDB database at PATH: matched files not yet ingested are appended to "
+                         "one table per log type, and the query reads the tables; file regexes become optional")
+parser.add_argument('--all-views', action='store_true',
+                    help="Scan every matched file and create a view for every log type, not just those the query references")
+default_cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'zeek-log-query')
+parser.add_argument('--metadata-cache', default=os.path.join(default_cache_dir, 'metadata.sqlite'),
+                    help="SQLite file caching header metadata by (path, inode, size, mtime) (default: %(default)s)")
+parser.add_argument('--no-metadata-cache', action='store_true',
+                    help="Read every file header, neither consulting nor updating the metadata cache")
+opts = parser.parse_args()
+
+min_args = 1 if opts.files_from or opts.stdin or opts.db else 2
+if len(opts.args) < min_args or opts.scan_workers < 1 or opts.walk_workers < 1:
+    parser.print_help()
     sys.exit(1)
+if opts.stdin and opts.files_from == '-':
+    parser.error("--stdin and --files-from - both read standard input")
+if opts.stdin and opts.sample_headers:
+    parser.error("--stdin can't be combined with --sample-headers, which may need to re-run the query")
+if opts.compact and not opts.parquet_cache:
+    parser.error("--compact needs --parquet-cache, whose files it merges")
+if opts.z_order and not opts.compact:
+    parser.error("--z-order only applies to files written by --compact")
+if opts.db and (opts.stdin or opts.sample_headers or opts.parquet_cache):
+    parser.error("--db can't be combined with --stdin, --sample-headers or --parquet-cache: ingested files are "
+                 "identified by path, read with their own headers and stored in the database")
 
 # Last argument is the SQL query, all others are file regex patterns
-file_regexes = [re.compile(arg) for arg in sys.argv[1:-1]]
-user_query = sys.argv[-1]
+regex_args = opts.args[:-1]
+file_regexes = [re.compile(arg) for arg in regex_args]
+user_query = opts.args[-1]
+
+def get_referenced_tables(sql):
+    """Returns the lower-cased table names sql reads from, or None if every view may be needed.
+
+    Uses DuckDB's own parser (json_serialize_sql). Statements it can't serialize, SHOW
+    statements, table functions and catalog schemas (information_schema, ...) return None.
+    """
+    try:
+        tree = json.loads(duckdb.connect().execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    except Exception:
+        return None
+    if tree.get('error'):
+        return None
+    tables, pending = set(), [tree]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(node)
+        elif isinstance(node, dict):
+            node_type = node.get('type')
+            if node_type == 'TABLE_FUNCTION' or (node_type == 'SHOW_REF' and node.get('table_name')):
+                return None
+            if node_type == 'BASE_TABLE':
+                if node.get('schema_name') not in ('', 'main'):
+                    return None
+                tables.add(node['table_name'].lower())
+            pending.extend(node.values())
+    return tables
+
+# Table describing every file the views read, one row per file_id
+FILES_TABLE = 'log_files'
+
+# Only the log types the query reads need views (and header scans)
+referenced_tables = None if opts.all_views else get_referenced_tables(user_query)
+if referenced_tables is not None and FILES_TABLE in referenced_tables:
+    referenced_tables = None  # log_files lists files of every log type
+
+time_window = opts.since is not None or opts.until is not None
+window_start = opts.since if opts.since is not None else float('-inf')
+window_end = opts.until if opts.until is not None else float('inf')
 
 # 2. Schema and Path Discovery
+# Magic bytes -> codec name (as used by read_csv's compression option where DuckDB has it)
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'BZh', 'bzip2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x04\x22\x4d\x18', 'lz4'),
+)
+# Codecs read_csv decompresses natively; everything else is streamed through DecompressingFileSystem
+DUCKDB_COMPRESSIONS = {'none', 'gzip', 'zstd'}
+
+# Bundles whose members are matched and read in place, like directories
+ARCHIVE_SUFFIXES = ('.tar', '.zip')
+# Compressed tarballs have no random access: every member read would decompress from the start
+COMPRESSED_TAR_SUFFIXES = ('.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.tar.zst')
+BUNDLE_SUFFIXES = ARCHIVE_SUFFIXES + COMPRESSED_TAR_SUFFIXES
+# Finds bundles among a directory's newline-joined file paths in one search
+BUNDLE_PATH_RE = re.compile('(?:' + '|'.join(map(re.escape, BUNDLE_SUFFIXES)) + ')$', re.IGNORECASE | re.MULTILINE)
+
+# Members of discovered tar/zip bundles: {abspath of archive/member: (archive, member name, data offset, size)}
+# (the offset is None for zip members, which are read through zip_archives)
+archive_members = {}
+zip_archives = {}
+
+# S3-compatible object stores: patterns starting with s3://bucket/ are listed from the store
+S3_SCHEME = 's3://'
+S3_NAMESPACE = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+# First ranged GET of an object; each further GET on the same stream doubles, up to S3_MAX_RANGE_BYTES
+S3_HEADER_BYTES = 16384
+S3_MAX_RANGE_BYTES = 8 << 20
+# Failed requests are retried this many times, waiting S3_RETRY_DELAY seconds, doubling each time.
+# S3 answers 503 SlowDown when throttling and 500 on internal errors; both ask the client to retry
+S3_RETRIES = 4
+S3_RETRY_DELAY = 0.2
+S3_RETRY_STATUSES = (500, 502, 503, 504)
+s3_region = os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or 'us-east-1'
+# {s3 path: (etag, size, mtime_ns)} for listed objects
+s3_objects = {}
+# Requests and bytes transferred, reported per run
+s3_stats = {'LIST': 0, 'HEAD': 0, 'GET': 0, 'bytes': 0}
+s3_stats_lock = threading.Lock()
+# Set once DuckDB's httpfs extension reads s3:// paths itself (see configure_httpfs())
+httpfs_loaded = False
+# Raw sizes of streams served by DecompressingFileSystem whose codec DuckDB still decompresses
+stream_sizes = {}
+
+# Stands for standard input (--stdin) in file lists and log_files.path
+STDIN_PATH = '-'
+# Standard input is handed to DuckDB in batches of about this many bytes
+STDIN_BATCH_BYTES = 1 << 20
+
+# Returned for files without a usable Zeek header
+NO_METADATA = (None, None, None, None, None, None)
+
+# Header values assumed until a file's own #separator/#set_separator/#empty_field/#unset_field lines say otherwise
+DEFAULT_READER = {'format': 'tsv', 'separator': '\t', 'set_separator': ',', 'empty_field': '(empty)', 'unset_field': '-'}
+
+# JSON logs have no header, so their fields are collected from this many leading records
+JSON_SAMPLE_LINES = 100
+
+# Zeek types infer_zeek_type() gives JSON numbers
+JSON_NUMBER_TYPES = ('count', 'int', 'double')
+
+# Times and intervals in Zeek's base logs other than 'ts'. JSON writes both as plain numbers,
+# so without TSV files of the same log type these get the types a TSV header would declare
+JSON_SECONDS_FIELDS = {
+    'duration': 'interval', 'rtt': 'interval', 'TTLs': 'vector[interval]', 'suppress_for': 'interval',
+    'ts_delta': 'interval', 'pkt_lag': 'interval', 'poll': 'interval', 'precision': 'interval',
+    'root_delay': 'interval', 'root_disp': 'interval', 'ref_time': 'time', 'org_time': 'time',
+    'rec_time': 'time', 'xmt_time': 'time',
+    'certificate.not_valid_before': 'time', 'certificate.not_valid_after': 'time',
+}
+
+def detect_compression(raw):
+    """Returns the codec of a buffered binary file from its magic bytes, without consuming them."""
+    magic = raw.peek(6)[:6]
+    for prefix, compression in COMPRESSION_MAGIC:
+        if magic.startswith(prefix):
+            return compression
+    return 'none'
+
+def open_decompressed(raw, compression):
+    """Wraps a binary file in a streaming decompressor for the given codec."""
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw)
+    if compression == 'bzip2':
+        return bz2.BZ2File(raw)
+    if compression == 'xz':
+        return lzma.LZMAFile(raw)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd compressed; install the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    if compression == 'lz4':
+        if lz4_frame is None:
+            raise ImportError("lz4 compressed; install the 'lz4' package")
+        return lz4_frame.LZ4FrameFile(raw)
+    return raw
+
+class ArchiveMemberFile(io.RawIOBase):
+    """A read-only, seekable view of the byte range a tar member occupies in its archive."""
+
+    def __init__(self, archive_path, offset, size):
+        self.raw = open(archive_path, 'rb')
+        self.offset, self.size, self.position = offset, size, 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = min(len(buffer), self.size - self.position)
+        if count <= 0:
+            return 0
+        self.raw.seek(self.offset + self.position)
+        count = self.raw.readinto(memoryview(buffer)[:count])
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+def list_archive(archive_path):
+    """Registers the regular-file members of a tar or zip bundle, returning their archive/member paths."""
+    archive_root = os.path.abspath(archive_path)
+    members = []
+    try:
+        if archive_path.endswith('.zip'):
+            archive = zipfile.ZipFile(archive_path)
+            zip_archives[archive_root] = archive
+            entries = [(info.filename, None, info.file_size) for info in archive.infolist() if not info.is_dir()]
+        else:
+            # 'r:' refuses compressed tarballs rather than decompressing them to find members
+            with tarfile.open(archive_path, 'r:') as archive:
+                entries = [(info.name, info.offset_data, info.size) for info in archive if info.isreg() and not info.issparse()]
+    except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+        print(f"[!] Warning: Could not list archive {archive_path}: {e}", file=sys.stderr)
+        return members
+    for name, offset, size in entries:
+        member_path = os.path.normpath(os.path.join(archive_path, name))
+        member_root = os.path.abspath(member_path)
+        # Absolute or '..' member names would escape the archive's namespace
+        if not member_root.startswith(archive_root + os.sep):
+            continue
+        archive_members[member_root] = (archive_root, name, offset, size)
+        members.append(member_path)
+    return members
+
+class ZeekStdinStream(io.RawIOBase):
+    """Standard input as a single Zeek TSV log, for --stdin.
+
+    The first header block is read up front and passed on unchanged. Header blocks further
+    down, from concatenated logs, are parsed in-band and dropped: rows following a block with
+    different #fields (or separators) are rearranged into the first header's columns, and rows
+    of another #path are skipped. Input is handed on in line-aligned batches of about
+    STDIN_BATCH_BYTES, so memory use doesn't grow with the stream. It can only be read once.
+    """
+
+    def __init__(self, raw):
+        compression = detect_compression(raw)
+        # zstandard's stream reader has no readline(), so decompressed input is buffered
+        self.source = raw if compression == 'none' else io.BufferedReader(open_decompressed(raw, compression))
+        header_lines = []
+        line = self.source.readline()
+        while line.startswith(b'#'):
+            header_lines.append(line)
+            line = self.source.readline()
+        self.header = b''.join(header_lines)
+        self.first_line = line
+        self.base = self.layout = self.parse_header(header_lines)
+        self.pending, self.offset = self.header + line, 0
+        self.block = []  # Header lines of a block whose data hasn't started yet
+        self.columns = None  # For rearranged rows: the current block's column for each first-header field
+        self.skipping = False
+        self.skipped_rows = {}  # {#path: rows}
+        self.dropped_fields = set()  # Fields already warned about
+        self.position = 0
+        self.opened = False
+
+    @staticmethod
+    def parse_header(lines):
+        """Returns a header block's settings, with values as bytes for matching raw rows."""
+        header = {key: value.encode() for key, value in DEFAULT_READER.items() if key != 'format'}
+        header.update({'path': None, 'fields': None, 'types': None})
+        for line in lines:
+            line = line.rstrip(b'\r\n')
+            if line.startswith(b'#separator '):
+                header['separator'] = line[len(b'#separator '):].decode('unicode_escape').encode()
+                continue
+            values = line.split(header['separator'])
+            key = values[0].decode(errors='replace')[1:]
+            if key in ('fields', 'types'):
+                header[key] = values[1:]
+            elif key in ('path', 'set_separator', 'empty_field', 'unset_field') and len(values) > 1:
+                header[key] = values[1]
+        return header
+
+    def open(self):
+        if self.opened:
+            raise OSError("standard input can only be scanned once per run")
+        self.opened = True
+        return self
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # DuckDB rewinds to the start of a file before reading it
+        if whence == io.SEEK_SET and offset == self.position:
+            return self.position
+        raise io.UnsupportedOperation("standard input is not seekable")
+
+    def readinto(self, buffer):
+        while self.offset >= len(self.pending):
+            batch = self.source.read(STDIN_BATCH_BYTES)
+            if not batch:
+                return 0
+            # End batches on a line boundary so header lines and rearranged rows are seen whole
+            if not batch.endswith(b'\n'):
+                batch += self.source.readline()
+            self.pending, self.offset = self.filter_batch(batch), 0
+        count = min(len(buffer), len(self.pending) - self.offset)
+        buffer[:count] = self.pending[self.offset:self.offset + count]
+        self.offset += count
+        self.position += count
+        return count
+
+    def filter_batch(self, batch):
+        """Drops in-band header lines from a batch and rearranges or skips the rows they govern."""
+        if self.columns is None and not self.skipping and not self.block \
+                and not batch.startswith(b'#') and b'\n#' not in batch:
+            return batch  # Same layout as the first header and no header lines: passed through as-is
+        rows = []
+        for line in batch.split(b'\n'):
+            if not line.rstrip(b'\r'):
+                continue
+            if line.startswith(b'#'):
+                self.block.append(line)
+                continue
+            if self.block:
+                self.start_block()
+            if self.skipping:
+                path = (self.layout['path'] or b'?').decode(errors='replace')
+                self.skipped_rows[path] = self.skipped_rows.get(path, 0) + 1
+            elif self.columns is not None:
+                rows.append(self.rearrange(line))
+            else:
+                rows.append(line + b'\n')
+        return b''.join(rows)
+
+    def start_block(self):
+        """Applies the header block just read to the rows that follow it."""
+        header = self.parse_header(self.block)
+        self.block = []
+        if header['fields'] is None:
+            return  # e.g. a lone #close: the previous layout continues
+        self.layout = header
+        self.skipping = header['path'] != self.base['path']
+        if self.skipping or header == self.base:
+            self.columns = None
+            return
+        positions = {field: i for i, field in enumerate(header['fields'])}
+        self.columns = [positions.get(field) for field in self.base['fields']]
+        dropped = [field.decode(errors='replace') for field in header['fields']
+                   if field not in self.base['fields'] and field.decode(errors='replace') not in self.dropped_fields]
+        if dropped:
+            self.dropped_fields.update(dropped)
+            print(f"[!] Warning: stdin: fields not in the first header are dropped: {', '.join(dropped)}", file=sys.stderr)
+
+    def rearrange(self, line):
+        """Rewrites a row of the current block in the first header's column order and null markers."""
+        layout, base = self.layout, self.base
+        values = line.rstrip(b'\r\n').split(layout['separator'])
+        markers = {layout['unset_field']: base['unset_field'], layout['empty_field']: base['empty_field']}
+        row = []
+        for i in self.columns:
+            value = values[i] if i is not None and i < len(values) else layout['unset_field']
+            value = markers.get(value, value)
+            if layout['set_separator'] != base['set_separator']:
+                value = value.replace(layout['set_separator'], base['set_separator'])
+            row.append(value)
+        return base['separator'].join(row) + b'\n'
+
+def is_s3_path(file_path):
+    return file_path.startswith(S3_SCHEME)
+
+def sign_s3_request(method, path, query_string, headers, access_key, secret_key):
+    """Adds an AWS Signature V4 authorization header covering every header in headers (lower-case names)."""
+    signed_headers = ';'.join(sorted(headers))
+    canonical_request = '\n'.join([method, path, query_string] + [f"{name}:{headers[name]}" for name in sorted(headers)]
+                                  + ['', signed_headers, headers['x-amz-content-sha256']])
+    scope = f"{headers['x-amz-date'][:8]}/{s3_region}/s3/aws4_request"
+    string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', headers['x-amz-date'], scope,
+                                hashlib.sha256(canonical_request.encode()).hexdigest()])
+    signing_key = ('AWS4' + secret_key).encode()
+    for part in scope.split('/'):
+        signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    headers['authorization'] = f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={signed_headers}, Signature={signature}"
+
+def s3_request(method, bucket, key='', query=None, byte_range=None):
+    """Sends a request to the object store, signed when AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY are set.
+
+    Returns (body, response headers). Custom endpoints are addressed path-style (MinIO and
+    most stand-ins), AWS virtual-hosted style. Server errors and dropped connections are retried
+    with exponential backoff (see S3_RETRIES).
+    """
+    if opts.s3_endpoint:
+        endpoint = urllib.parse.urlsplit(opts.s3_endpoint)
+        scheme, host, path = endpoint.scheme, endpoint.netloc, endpoint.path.rstrip('/') + f"/{bucket}/{key}"
+    else:
+        scheme, host, path = 'https', f"{bucket}.s3.{s3_region}.amazonaws.com", f"/{key}"
+    path = urllib.parse.quote(path, safe='/-_.~')
+    query_string = '&'.join(f"{urllib.parse.quote(k, safe='-_.~')}={urllib.parse.quote(v, safe='-_.~')}"
+                            for k, v in sorted((query or {}).items()))
+    headers = {'host': host, 'x-amz-content-sha256': 'UNSIGNED-PAYLOAD',
+               'x-amz-date': datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')}
+    if byte_range:
+        headers['range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+    if os.environ.get('AWS_SESSION_TOKEN'):
+        headers['x-amz-security-token'] = os.environ['AWS_SESSION_TOKEN']
+    if os.environ.get('AWS_ACCESS_KEY_ID') and os.environ.get('AWS_SECRET_ACCESS_KEY'):
+        sign_s3_request(method, path, query_string, headers, os.environ['AWS_ACCESS_KEY_ID'], os.environ['AWS_SECRET_ACCESS_KEY'])
+    del headers['host']  # urllib sends the same value, taken from the URL
+    request = urllib.request.Request(f"{scheme}://{host}{path}" + (f"?{query_string}" if query_string else ''),
+                                     headers=headers, method=method)
+    for attempt in range(S3_RETRIES + 1):
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                body, response_headers = response.read(), response.headers
+            break
+        except urllib.error.HTTPError as e:
+            if e.code == 416:
+                body, response_headers = b'', e.headers  # Range starts at or past the end of the object
+                break
+            error = f"HTTP {e.code} {e.reason}"
+            if e.code not in S3_RETRY_STATUSES:
+                raise OSError(f"{method} {S3_SCHEME}{bucket}/{key}: {error}") from None
+        except urllib.error.URLError as e:
+            error = e.reason
+        except (http.client.HTTPException, OSError) as e:
+            error = e  # Connection reset or timed out while reading the body
+        if attempt == S3_RETRIES:
+            raise OSError(f"{method} {S3_SCHEME}{bucket}/{key}: {error}") from None
+        time.sleep(S3_RETRY_DELAY * 2 ** attempt)
+    with s3_stats_lock:
+        s3_stats['LIST' if method == 'GET' and not key else method] += 1
+        s3_stats['bytes'] += len(body)
+    return body, response_headers
+
+def split_s3_path(file_path):
+    """Splits s3://bucket/key into (bucket, key)."""
+    bucket, _, key = file_path[len(S3_SCHEME):].partition('/')
+    return bucket, key
+
+def list_s3_directory(bucket, prefix):
+    """Lists one level of an S3 prefix, returning (object paths, sub-prefixes worth listing).
+
+    Like scan_directory(), sub-prefixes are pruned by the patterns' directory components and
+    by archive day outside the time window, before any request is made for them.
+    """
+    object_paths, subdirs, token = [], [], None
+    while True:
+        query = {'list-type': '2', 'prefix': prefix, 'delimiter': '/'}
+        if token:
+            query['continuation-token'] = token
+        try:
+            listing = ElementTree.fromstring(s3_request('GET', bucket, query=query)[0])
+        except (OSError, ElementTree.ParseError) as e:
+            print(f"[!] Warning: Could not list s3://{bucket}/{prefix}: {e}", file=sys.stderr)
+            return object_paths, subdirs
+        for item in listing.iter(f'{S3_NAMESPACE}Contents'):
+            key = item.findtext(f'{S3_NAMESPACE}Key')
+            if key.endswith('/'):
+                continue  # Folder marker
+            object_path = f"{S3_SCHEME}{bucket}/{key}"
+            modified = datetime.datetime.fromisoformat(item.findtext(f'{S3_NAMESPACE}LastModified').replace('Z', '+00:00'))
+            # Whole seconds, as HEAD's Last-Modified has (see get_s3_identity()), so an object's identity
+            # doesn't depend on which request saw it
+            s3_objects[object_path] = (item.findtext(f'{S3_NAMESPACE}ETag'), int(item.findtext(f'{S3_NAMESPACE}Size')),
+                                       int(modified.timestamp()) * 1_000_000_000)
+            object_paths.append(object_path)
+        for item in listing.iter(f'{S3_NAMESPACE}CommonPrefixes'):
+            subdir = item.findtext(f'{S3_NAMESPACE}Prefix')
+            dir_path = f"{S3_SCHEME}{bucket}/{subdir.rstrip('/')}"
+            if directory_is_viable(dir_path) and directory_in_window(os.path.basename(dir_path)):
+                subdirs.append(subdir)
+        if listing.findtext(f'{S3_NAMESPACE}IsTruncated') != 'true':
+            return object_paths, subdirs
+        token = listing.findtext(f'{S3_NAMESPACE}NextContinuationToken')
+
+def walk_s3(root, pool):
+    """Yields the object paths under an s3://bucket/prefix root, one prefix level at a time (see walk_files)."""
+    bucket, prefix = split_s3_path(root)
+    list_level = lambda prefix: list_s3_directory(bucket, prefix)
+    level = [prefix]
+    while level:
+        next_level = []
+        for object_paths, subdirs in (pool.map(list_level, level) if pool else map(list_level, level)):
+            yield from object_paths
+            next_level.extend(subdirs)
+        level = next_level
+
+def get_s3_identity(file_path):
+    """Returns an object's (etag, size, mtime_ns), from its listing or a HEAD request."""
+    if file_path not in s3_objects:
+        _, headers = s3_request('HEAD', *split_s3_path(file_path))
+        modified = email.utils.parsedate_to_datetime(headers['Last-Modified'])
+        s3_objects[file_path] = (headers.get('ETag'), int(headers['Content-Length']), int(modified.timestamp()) * 1_000_000_000)
+    return s3_objects[file_path]
+
+class S3ObjectFile(io.RawIOBase):
+    """Sequential reads of an object through ranged GETs that start at S3_HEADER_BYTES and double.
+
+    A header scan usually needs just the first GET; a full scan soon moves to large ranges.
+    """
+
+    def __init__(self, file_path):
+        self.bucket, self.key = split_s3_path(file_path)
+        self.size = get_s3_identity(file_path)[1]
+        self.position, self.range_bytes = 0, S3_HEADER_BYTES
+        self.buffer, self.buffer_start = b'', 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+        if not self.buffer_start <= self.position < self.buffer_start + len(self.buffer):
+            end = min(self.size, self.position + max(len(buffer), self.range_bytes)) - 1
+            self.buffer, _ = s3_request('GET', self.bucket, self.key, byte_range=(self.position, end))
+            self.buffer_start = self.position
+            self.range_bytes = min(self.range_bytes * 2, S3_MAX_RANGE_BYTES)
+            if not self.buffer:
+                return 0
+        offset = self.position - self.buffer_start
+        count = min(len(buffer), len(self.buffer) - offset)
+        buffer[:count] = self.buffer[offset:offset + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+def open_binary(file_path):
+    """Opens a file, a tar/zip member or an S3 object as a buffered binary stream without extracting anything."""
+    if file_path == STDIN_PATH and stdin_stream is not None:
+        # Header reads see a copy of the header block; the stream itself is left for DuckDB
+        return io.BufferedReader(io.BytesIO(stdin_stream.header))
+    if is_s3_path(file_path):
+        return io.BufferedReader(S3ObjectFile(file_path), S3_HEADER_BYTES)
+    member = archive_members.get(os.path.abspath(file_path))
+    if member is None:
+        return open(file_path, 'rb')
+    archive_root, name, offset, size = member
+    if offset is None:
+        # ZipFile serializes reads of its shared file handle, so members can be open in several threads
+        return io.BufferedReader(zip_archives[archive_root].open(name))
+    return io.BufferedReader(ArchiveMemberFile(archive_root, offset, size))
+
+def read_zstd_header_with_duckdb(file_path, max_lines=15):
+    """Reads the first lines of a zstd file through DuckDB's built-in decompression."""
+    if os.path.abspath(file_path) in archive_members:
+        raise ImportError("zstd compressed archive member; install the 'zstandard' package")
+    rows = duckdb.connect().execute(
+        "SELECT line FROM read_csv(?, compression='zstd', header=false, auto_detect=false, "
+        "delim=chr(1), quote='', escape='', columns={'line': 'VARCHAR'}) LIMIT ?",
+        [file_path, max_lines]).fetchall()
+    return ''.join(f"{line}\n" for (line,) in rows)
+
+def open_log(file_path):
+    """Opens a Zeek log as text, detecting its codec by magic bytes. Returns (file, compression)."""
+    raw = open_binary(file_path)
+    compression = detect_compression(raw)
+    if compression == 'zstd' and zstandard is None:
+        raw.close()
+        return io.StringIO(read_zstd_header_with_duckdb(file_path)), compression
+    # Plain logs (e.g. current/conn.log while Zeek is writing it) are read buffered, without decompression
+    return io.TextIOWrapper(open_decompressed(raw, compression), errors='replace'), compression
+
+if fsspec is not None:
+    class DecompressingFileSystem(fsspec.AbstractFileSystem):
+        """Exposes bzip2/xz/lz4 logs to DuckDB as plain text, decompressing on the fly, and
+        tar/zip members as the files they contain.
+
+        DuckDB reads these as zeekcodec:///abs/path. Members in a codec DuckDB handles are
+        passed through as-is, with their real size. Otherwise the decompressed size is unknown
+        without a full pass, so a huge size is reported and DuckDB reads until EOF.
+        """
+        protocol = 'zeekcodec'
+        UNKNOWN_SIZE = 1 << 62
+
+        def _open(self, path, mode='rb', **kwargs):
+            if self._strip_protocol(path) == STDIN_PATH:
+                return stdin_stream.open()
+            raw = open_binary(self._strip_protocol(path))
+            compression = detect_compression(raw)
+            return raw if compression in DUCKDB_COMPRESSIONS else open_decompressed(raw, compression)
+
+        def info(self, path, **kwargs):
+            return {'name': path, 'size': stream_sizes.get(self._strip_protocol(path), self.UNKNOWN_SIZE), 'type': 'file'}
+
+def absolute_path(file_path):
+    """Returns file_path made absolute (S3 paths already are), as used for cache keys and archive members."""
+    return file_path if is_s3_path(file_path) else os.path.abspath(file_path)
+
+def get_scan_path(file_path, compression):
+    """Returns the path read_csv should read a file through."""
+    if file_path == STDIN_PATH:
+        return 'zeekcodec://' + STDIN_PATH
+    path = absolute_path(file_path)
+    member = archive_members.get(path)
+    if compression in DUCKDB_COMPRESSIONS:
+        if member is None and (not is_s3_path(path) or httpfs_loaded):
+            return file_path
+        # Passed through to DuckDB undecompressed, so DuckDB gets the real size
+        stream_sizes[path] = member[3] if member else get_s3_identity(path)[1]
+    return 'zeekcodec://' + path
+
 def get_log_metadata(file_path):
-    """Extracts Zeek #path, #fields, and #types."""
+    """Extracts Zeek #path, #fields, #types, the #open time (epoch seconds, or None), the file's
+    compression, and the reader settings its header declares (see DEFAULT_READER) plus the
+    number of header lines preceding the data."""
     try:
-        with gzip.open(file_path, 'rt') as f:
-            log_path, fields, types = None, [], []
-            for _ in range(15): # Scan first 15 lines
-                line = f.readline()
+        f, compression = open_log(file_path)
+        with f:
+            first_line = f.readline()
+            if first_line.startswith('{'):
+                return get_json_log_metadata(file_path, first_line, f, compression)
+            log_path, fields, types, open_ts = None, [], [], None
+            reader = dict(DEFAULT_READER)
+            for line_number in range(1, 16): # Scan first 15 lines
+                line = first_line if line_number == 1 else f.readline()
                 if not line: break
-                if line.startswith('#path'):
-                    log_path = line.strip().split('\t')[1]
-                elif line.startswith('#fields'):
-                    fields = line.strip().split('\t')[1:]
-                elif line.startswith('#types'):
-                    types = line.strip().split('\t')[1:]
+                line = line.rstrip('\r\n')
+                if line.startswith('#separator '):
+                    # The only header line not itself separator-delimited: '#separator \x09'
+                    reader['separator'] = line[len('#separator '):].encode().decode('unicode_escape')
+                    continue
+                values = line.split(reader['separator'])
+                if values[0] == '#set_separator':
+                    reader['set_separator'] = values[1]
+                elif values[0] == '#empty_field':
+                    reader['empty_field'] = values[1]
+                elif values[0] == '#unset_field':
+                    reader['unset_field'] = values[1]
+                elif values[0] == '#path':
+                    log_path = values[1]
+                elif values[0] == '#open':
+                    open_ts = parse_zeek_time(values[1])
+                elif values[0] == '#fields':
+                    fields = values[1:]
+                elif values[0] == '#types':
+                    types = values[1:]
                     if log_path and fields and types:
-                        return log_path, fields, types
+                        reader['header_lines'] = line_number
+                        return log_path, fields, types, open_ts, compression, reader
     except Exception as e:
         print(f"[!] Warning: Could not read {file_path}: {e}", file=sys.stderr)
-    return None, None, None
+    return NO_METADATA
+
+def infer_zeek_type(value):
+    """Returns the narrowest Zeek type that holds a JSON log value.
+
+    An empty list gives 'vector[]', whose element type is left to widen_zeek_type().
+    """
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int' if value < 0 else 'count'
+    if isinstance(value, float):
+        return 'double'
+    if isinstance(value, list):
+        elem_type = ''
+        for item in value:
+            elem_type = widen_zeek_type(elem_type, infer_zeek_type(item))
+        return f"vector[{elem_type}]"
+    if isinstance(value, str):
+        try:
+            ipaddress.ip_address(value)
+            return 'addr'
+        except ValueError:
+            pass
+    return 'string'
+
+def widen_zeek_type(a, b):
+    """Returns the narrowest Zeek type that holds values of both infer_zeek_type() results a and b.
+
+    An empty type ('' or None) holds nothing yet. Mixed numbers widen to 'int' or 'double',
+    vectors element-wise, and anything else that differs (an address and another string, say)
+    to 'string'.
+    """
+    if not a or a == b:
+        return b
+    if not b:
+        return a
+    if a.startswith('vector[') and b.startswith('vector['):
+        return f"vector[{widen_zeek_type(a[7:-1], b[7:-1])}]"
+    if a in JSON_NUMBER_TYPES and b in JSON_NUMBER_TYPES:
+        return 'double' if 'double' in (a, b) else 'int'
+    return 'string'
+
+def get_json_log_metadata(file_path, first_line, f, compression):
+    """Returns get_log_metadata()'s tuple for a Zeek JSON log (LogAscii::use_json=T).
+
+    Fields and types are collected from the first JSON_SAMPLE_LINES records; Zeek leaves unset
+    fields out, so a field missing from all of them is only picked up from TSV files of the same
+    log type (see align_json_schemas()). The log type is the records' _path, or else the file name
+    prefix. Each field's type is the narrowest that holds all of its sampled values, so a field is
+    only an 'addr' if every sampled value is an address. 'ts' is always a time, and numbers in the
+    fields of JSON_SECONDS_FIELDS are times or intervals.
+    """
+    log_path, types, time_format = None, {}, 'epoch'
+    for line in [first_line] + [f.readline() for _ in range(JSON_SAMPLE_LINES - 1)]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break  # End of file, or a partially written last line
+        log_path = log_path or record.pop('_path', None)
+        record.pop('_path', None)
+        for key, value in record.items():
+            if value is not None:
+                types[key] = widen_zeek_type(types.get(key), infer_zeek_type(value))
+        if isinstance(record.get('ts'), str):
+            time_format = 'iso8601'  # LogAscii::json_timestamps=JSON::TS_ISO8601
+    if not types:
+        return NO_METADATA
+    for key, zeek_type in types.items():
+        if zeek_type == 'vector[]':
+            types[key] = 'vector[string]'  # Only empty lists were sampled
+        elif key in JSON_SECONDS_FIELDS:
+            seconds_type = JSON_SECONDS_FIELDS[key]
+            is_vector = seconds_type.startswith('vector[')
+            elem_type = zeek_type[7:-1] if is_vector and zeek_type.startswith('vector[') else zeek_type
+            # ISO 8601 times are strings; intervals stay numbers either way
+            iso_time = time_format == 'iso8601' and seconds_type == 'time' and elem_type == 'string'
+            if is_vector == zeek_type.startswith('vector[') and (elem_type in JSON_NUMBER_TYPES or iso_time):
+                types[key] = seconds_type
+    if 'ts' in types:
+        types['ts'] = 'time'
+    log_path = log_path or os.path.basename(file_path).split('.', 1)[0]
+    return log_path, list(types), list(types.values()), None, compression, {'format': 'json', 'time_format': time_format}
+
+def parse_zeek_time(value):
+    """Parses a Zeek #open/#close header value (local time, %Y-%m-%d-%H-%M-%S) to epoch seconds."""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d-%H-%M-%S').timestamp()
+    except ValueError:
+        return None
+
+# Zeek archive layout: YYYY-MM-DD/<log>.HH:MM:SS-HH:MM:SS.log[.gz], in local time
+ARCHIVE_DAY_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+ARCHIVE_FILE_RE = re.compile(r'^[^.]+\.(\d{2}):(\d{2}):(\d{2})-(\d{2}):(\d{2}):(\d{2})\.')
+
+def get_archive_day_range(dir_name):
+    """Returns the (start, end) epoch range of a YYYY-MM-DD archive directory, or None."""
+    day_match = ARCHIVE_DAY_RE.match(dir_name)
+    if not day_match:
+        return None
+    try:
+        day = datetime.datetime(*map(int, day_match.groups()))
+    except ValueError:
+        return None
+    # Include the following midnight: the last rotation of a day closes at 00:00:00
+    return day.timestamp(), (day + datetime.timedelta(days=1, seconds=1)).timestamp()
+
+def get_archive_file_range(file_path):
+    """Returns the (start, end) epoch range encoded in an archived log's directory and name, or None."""
+    day_match = ARCHIVE_DAY_RE.match(os.path.basename(os.path.dirname(file_path)))
+    file_match = ARCHIVE_FILE_RE.match(os.path.basename(file_path))
+    if not day_match or not file_match:
+        return None
+    try:
+        day = datetime.datetime(*map(int, day_match.groups()))
+        h1, m1, s1, h2, m2, s2 = map(int, file_match.groups())
+        start = day.replace(hour=h1, minute=m1, second=s1)
+        end = day.replace(hour=h2, minute=m2, second=s2)
+    except ValueError:
+        return None
+    if end <= start:
+        end += datetime.timedelta(days=1)  # Rotation crossing midnight, e.g. 23:00:00-00:00:00
+    return start.timestamp(), end.timestamp()
+
+def overlaps_window(start, end):
+    """Returns True if [start, end) intersects the --since/--until window."""
+    return start < window_end and end > window_start
+
+def get_directory_matchers(pattern_str):
+    """Derives per-level directory name matchers from an anchored file regex.
+
+    Absolute and s3:// patterns (which already choose their search root from the
+    literal path prefix) and relative patterns starting with '^' are split on top-level
+    '/' separators. Each leading component that cannot itself match a '/' becomes
+    a full-match regex for directory names at that depth. Returns an empty list
+    when the pattern gives no usable constraint, meaning no directory can be pruned.
+    """
+    if pattern_str.startswith('^'):
+        pattern_str = pattern_str[1:]
+    elif not pattern_str.startswith(('/', S3_SCHEME)):
+        return []  # Unanchored: a match may start at any depth
+
+    components, start, depth, i = [], 0, 0, 0
+    while i < len(pattern_str):
+        c = pattern_str[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            # Skip the character class, including a leading ']' or '^]'
+            i += 2 if pattern_str[i + 1:i + 2] == '^' else 1
+            i += 1 if pattern_str[i:i + 1] == ']' else 0
+            while i < len(pattern_str) and pattern_str[i] != ']':
+                i += 2 if pattern_str[i] == '\\' else 1
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return []  # Top-level alternation: each branch may be rooted differently
+        elif c == '/':
+            if depth > 0 or pattern_str[i + 1:i + 2] in ('?', '*', '+', '{'):
+                break  # Separator inside a group or quantified: stop splitting here
+            components.append(pattern_str[start:i])
+            start = i + 1
+        i += 1
+
+    matchers = []
+    for component in components:
+        # Anything that can match '/' could span several directory levels
+        if re.search(r'(?<!\\)(?:\\\\)*(?:\.|\[\^|\\[SWD0-9])', component) or '/' in component:
+            break
+        try:
+            matchers.append(re.compile(component))
+        except re.error:
+            break
+    return matchers
+
+def get_sample_group(file_path):
+    """Returns the (directory, log name prefix) group a file shares its header with in --sample-headers mode."""
+    return os.path.dirname(file_path), os.path.basename(file_path).split('.', 1)[0]
+
+def get_file_identity(file_path):
+    """Returns the (inode, size, mtime_ns) triple used to validate cached metadata.
+
+    Archive members take the archive's inode and mtime, with their own size. S3 objects use a
+    checksum of their ETag in place of the inode.
+    """
+    if is_s3_path(file_path):
+        etag, size, mtime_ns = get_s3_identity(file_path)
+        return zlib.crc32((etag or '').encode()), size, mtime_ns
+    member = archive_members.get(os.path.abspath(file_path))
+    st = os.stat(member[0] if member else file_path)
+    return st.st_ino, member[3] if member else st.st_size, st.st_mtime_ns
+
+# Bump whenever the shape of get_log_metadata()'s result changes; older caches are discarded
+METADATA_CACHE_VERSION = 5
+
+def open_metadata_cache(cache_path):
+    """Opens the header metadata cache, returning (connection, {abspath: (identity, metadata)})."""
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        cache_con = sqlite3.connect(cache_path)
+        if cache_con.execute("PRAGMA user_version").fetchone()[0] != METADATA_CACHE_VERSION:
+            with cache_con:
+                cache_con.execute("DROP TABLE IF EXISTS header_cache")
+                cache_con.execute(f"PRAGMA user_version = {METADATA_CACHE_VERSION}")
+        cache_con.execute("""
+            CREATE TABLE IF NOT EXISTS header_cache (
+                path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime_ns INTEGER, metadata TEXT
+            )
+        """)
+        entries = {}
+        for path, inode, size, mtime_ns, metadata in cache_con.execute("SELECT * FROM header_cache"):
+            entries[path] = ((inode, size, mtime_ns), tuple(json.loads(metadata)))
+        return cache_con, entries
+    except (sqlite3.Error, OSError) as e:
+        print(f"[!] Warning: Metadata cache {cache_path} unavailable: {e}", file=sys.stderr)
+        return None, {}
+
+def scan_file(file_path):
+    """Returns (identity, metadata, cache_hit) for a file, reading its header only on a cache miss."""
+    if file_path == STDIN_PATH:
+        return None, get_log_metadata(file_path), False  # Never cached: there's nothing to identify it by
+    try:
+        identity = get_file_identity(file_path)
+    except OSError as e:
+        print(f"[!] Warning: Could not stat {file_path}: {e}", file=sys.stderr)
+        return None, NO_METADATA, False
+    cached = cache_entries.get(absolute_path(file_path))
+    if cached and cached[0] == identity:
+        return identity, cached[1], True
+    return identity, get_log_metadata(file_path), False
 
 t0 = time.perf_counter()
 # Find all files matching any of the regex patterns (recursively)
 all_files = set()
 
-# Determine search root: if pattern starts with /, search from root, otherwise from current dir
-search_roots = set()
-for pattern_str in sys.argv[1:-1]:
-    if pattern_str.startswith('/'):
-        # Absolute path pattern - extract the root directory to search from
-        # Find the longest existing directory prefix
-        parts = pattern_str.split('/')
-        for i in range(len(parts), 0, -1):
-            test_path = '/'.join(parts[:i]) if i > 1 else '/'
-            if os.path.isdir(test_path):
-                search_roots.add(test_path)
-                break
-        else:
-            search_roots.add('/')  # Fallback to root
+# Combine all patterns into one alternation so each path is scanned by a single regex
+if not regex_args:
+    path_matches = lambda path: True  # Only possible with --files-from: keep every listed file
+else:
+    try:
+        combined_regex = re.compile('|'.join(f"(?:{pattern_str})" for pattern_str in regex_args))
+        path_matches = combined_regex.search
+    except re.error:
+        # e.g. global inline flags or numbered backreferences that don't survive concatenation
+        path_matches = lambda path: any(pattern.search(path) for pattern in file_regexes)
+
+# A directory only needs to be entered if at least one pattern could match beneath it
+directory_matchers = [get_directory_matchers(pattern_str) for pattern_str in regex_args]
+prune_directories = all(matchers for matchers in directory_matchers)
+
+def directory_is_viable(dir_path):
+    """Returns True if some pattern's leading directory components accept dir_path."""
+    if not prune_directories:
+        return True
+    components = dir_path.split(os.sep)
+    for matchers in directory_matchers:
+        if all(m.fullmatch(c) for m, c in zip(matchers, components)):
+            return True
+    return False
+
+def directory_in_window(dir_name):
+    """Returns False for YYYY-MM-DD archive directories entirely outside the time window."""
+    if not time_window:
+        return True
+    day_range = get_archive_day_range(dir_name)
+    return day_range is None or overlaps_window(*day_range)
+
+def scan_directory(dir_path):
+    """Lists one directory, returning (normalized file paths, viable subdirectories)."""
+    file_paths, subdirs = [], []
+    try:
+        entries = os.scandir(dir_path)
+    except OSError:
+        return file_paths, subdirs  # os.walk() silently skips unreadable directories too
+    # Normalizing the directory once is much cheaper than normalizing each entry's path
+    prefix = os.path.normpath(dir_path)
+    prefix = '' if prefix == '.' else prefix.rstrip(os.sep) + os.sep
+    with entries:
+        for entry in entries:
+            normalized_path = prefix + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                file_paths.append(normalized_path)
+            elif not entry.is_symlink() and directory_is_viable(normalized_path) and directory_in_window(entry.name):
+                subdirs.append(entry.path)
+    return file_paths, subdirs
+
+def walk_files(search_root, pool):
+    """Yields the normalized paths of the files under search_root as one list per directory, one level at a time.
+
+    Each level's directories are listed concurrently on the pool (one scandir per
+    directory), which hides per-directory metadata latency on network filesystems.
+    """
+    level = [search_root]
+    while level:
+        next_level = []
+        for file_paths, subdirs in (pool.map(scan_directory, level) if pool else map(scan_directory, level)):
+            yield file_paths
+            next_level.extend(subdirs)
+        level = next_level
+
+def matching_files(normalized_path):
+    """Returns the paths a discovered file contributes: itself if it matches, or its matching members if it's a bundle.
+
+    Bundles are treated like directories named after the archive file, so patterns match
+    archive/member paths, such as bundle.tar/2024-05-01/conn.00:00:00-01:00:00.log.gz.
+    """
+    lower_path = normalized_path.lower()
+    if is_s3_path(normalized_path):
+        return [normalized_path] if path_matches(normalized_path) else []
+    if lower_path.endswith(ARCHIVE_SUFFIXES):
+        if not directory_is_viable(normalized_path):
+            return []
+        return [member_path for member_path in list_archive(normalized_path) if path_matches(member_path)]
+    if lower_path.endswith(COMPRESSED_TAR_SUFFIXES) and directory_is_viable(normalized_path):
+        print(f"[!] Warning: Skipping {normalized_path}: compressed tarballs can't be read in place; "
+              f"decompress the outer layer (the logs inside may stay compressed)", file=sys.stderr)
+        return []
+    return [normalized_path] if path_matches(normalized_path) else []
+
+def get_s3_root(pattern_str):
+    """Returns the s3://bucket/prefix every match of an s3:// pattern starts with, for listing.
+
+    The prefix is the pattern's literal text up to its first regex construct, so it may end
+    mid-name (s3://bucket/zeek/2024-05-01/conn.) and the store filters by it server-side.
+    """
+    pattern_str = pattern_str[1:] if pattern_str.startswith('^') else pattern_str
+    if re.search(r'(?<!\\)(?:\\\\)*\|', pattern_str):
+        pattern_str = S3_SCHEME + split_s3_path(pattern_str)[0] + '/'  # Alternation: only the bucket is certain
+    prefix, i = [], 0
+    while i < len(pattern_str):
+        c, step = pattern_str[i], 1
+        if c == '\\' and i + 1 < len(pattern_str) and not pattern_str[i + 1].isalnum():
+            c, step = pattern_str[i + 1], 2  # Escaped punctuation, e.g. '\.'
+        elif c in '.^$*+?{}[]()\\':
+            break
+        if pattern_str[i + step:i + step + 1] in ('?', '*', '{'):
+            break  # The character is optional or repeated
+        prefix.append(c)
+        i += step
+    return ''.join(prefix)
+
+def read_file_list(source):
+    """Reads newline- or NUL-separated file paths from a manifest file, or stdin for '-'."""
+    if source == '-':
+        data = sys.stdin.buffer.read()
     else:
-        search_roots.add('.')  # Relative pattern, search from current dir
-
-# If no absolute paths found, default to current directory
-if not search_roots:
-    search_roots.add('.')
-
-# Search from all identified roots
-for search_root in search_roots:
-    for root, dirs, files in os.walk(search_root):
-        for file in files:
-            file_path = os.path.join(root, file)
-            # Normalize path for consistent matching
-            normalized_path = os.path.normpath(file_path)
-            # Check if file matches any of the regex patterns
-            if any(pattern.search(normalized_path) for pattern in file_regexes):
-                all_files.add(normalized_path)
+        with open(source, 'rb') as f:
+            data = f.read()
+    if b'\0' in data:
+        entries = data.split(b'\0')  # find -print0 style: names may contain newlines
+    else:
+        entries = [line.rstrip(b'\r') for line in data.split(b'\n')]
+    return [os.fsdecode(entry) for entry in entries if entry]
+
+if opts.files_from:
+    # The manifest replaces the directory walk entirely; regexes (if any) only filter it
+    t_discovery = time.perf_counter()
+    try:
+        listed_files = read_file_list(opts.files_from)
+    except OSError as e:
+        print(f"[!] Error: Could not read file list {opts.files_from}: {e}", file=sys.stderr)
+        sys.exit(1)
+    for file_path in listed_files:
+        all_files.update(matching_files(file_path if is_s3_path(file_path) else os.path.normpath(file_path)))
+    t_discovery = time.perf_counter() - t_discovery
+    print(f"[*] Selected {len(all_files):,} of {len(listed_files):,} listed files in {t_discovery:.4f}s", file=sys.stderr)
+elif regex_args:  # With --stdin or --db alone there's nothing to walk
+    # Determine search root: if pattern starts with /, search from root, otherwise from current dir
+    search_roots = set()
+    s3_roots = set()
+    for pattern_str in regex_args:
+        if pattern_str.lstrip('^').startswith(S3_SCHEME):
+            # Object store pattern - list from its bucket and literal key prefix
+            s3_root = get_s3_root(pattern_str)
+            if not split_s3_path(s3_root)[0] or '/' not in s3_root[len(S3_SCHEME):]:
+                print(f"[!] Error: S3 pattern {pattern_str!r} must start with a literal s3://bucket/", file=sys.stderr)
+                sys.exit(1)
+            s3_roots.add(s3_root)
+        elif pattern_str.startswith('/'):
+            # Absolute path pattern - extract the root directory to search from
+            # Find the longest existing directory prefix
+            parts = pattern_str.split('/')
+            for i in range(len(parts), 0, -1):
+                test_path = '/'.join(parts[:i]) if i > 1 else '/'
+                if os.path.isdir(test_path):
+                    search_roots.add(test_path)
+                    break
+            else:
+                search_roots.add('/')  # Fallback to root
+        else:
+            search_roots.add('.')  # Relative pattern, search from current dir
+
+    # If no absolute paths found, default to current directory
+    if not search_roots and not s3_roots:
+        search_roots.add('.')
+
+    # Search from all identified roots
+    t_discovery = time.perf_counter()
+    walk_pool = ThreadPoolExecutor(max_workers=opts.walk_workers) if opts.walk_workers > 1 else None
+    for search_root in search_roots:
+        for file_paths in walk_files(search_root, walk_pool):
+            # Check if each file (or, for bundles, each member) matches any of the regex patterns.
+            # Most directories hold only plain logs, which are matched without a Python-level
+            # loop or matching_files()'s bundle checks
+            if BUNDLE_PATH_RE.search('\n'.join(file_paths)):
+                for normalized_path in file_paths:
+                    all_files.update(matching_files(normalized_path))
+            else:
+                all_files.update(filter(path_matches, file_paths))
+    # A root that is a prefix of another lists the other's objects already
+    for s3_root in sorted(s3_roots):
+        if not any(s3_root.startswith(other) for other in s3_roots if other != s3_root):
+            all_files.update(object_path for object_path in walk_s3(s3_root, walk_pool) if path_matches(object_path))
+    if walk_pool:
+        walk_pool.shutdown()
+    t_discovery = time.perf_counter() - t_discovery
+    print(f"[*] Discovered {len(all_files):,} matching files in {t_discovery:.4f}s ({opts.walk_workers} walk workers)", file=sys.stderr)
+
+# Standard input is read as one more file, named '-'. Only its header block is read here;
+# the rest is left in the pipe until the query scans it
+stdin_stream = None
+if opts.stdin:
+    if fsspec is None:
+        print("[!] Error: --stdin requires the 'fsspec' package", file=sys.stderr)
+        sys.exit(1)
+    try:
+        stdin_stream = ZeekStdinStream(sys.stdin.buffer)
+    except Exception as e:  # A missing codec module, or corrupt compressed input
+        print(f"[!] Error: Could not read standard input: {e or type(e).__name__}", file=sys.stderr)
+        sys.exit(1)
+    if not stdin_stream.header:
+        print("[!] Error: Standard input doesn't start with a Zeek TSV header (JSON streams aren't supported)", file=sys.stderr)
+        sys.exit(1)
+    all_files.add(STDIN_PATH)
 
 all_files = sorted(all_files)
-# Dict structure: { "conn": { "field_string": { "fields": [], "types": [], "files": [] } } }
-log_collections = {}
 
-for fname in all_files:
-    l_path, f_list, t_list = get_log_metadata(fname)
-    if not all([l_path, f_list, t_list]): continue
+# Files whose archive name places them outside the time window never need their header read
+pruned_by_name = 0
+file_ranges = {}
+if time_window:
+    kept_files = []
+    for fname in all_files:
+        file_range = get_archive_file_range(fname)
+        if file_range and not overlaps_window(*file_range):
+            pruned_by_name += 1
+            continue
+        file_ranges[fname] = file_range
+        kept_files.append(fname)
+    all_files = kept_files
+
+if opts.no_metadata_cache:
+    cache_con, cache_entries = None, {}
+else:
+    cache_con, cache_entries = open_metadata_cache(opts.metadata_cache)
+
+# Skip files that can't hold a referenced log type, judging by their name prefix
+# (conn.*, dns.*, ...) or by the #path already recorded in the metadata cache
+skipped_by_query = 0
+if referenced_tables is not None:
+    kept_files = []
+    for fname in all_files:
+        cached = cache_entries.get(absolute_path(fname))
+        name_prefix = os.path.basename(fname).split('.', 1)[0].lower()
+        # Standard input has no name to go by; its #path is checked once its header is parsed
+        if fname == STDIN_PATH or name_prefix in referenced_tables or (cached and cached[1][0].lower() in referenced_tables):
+            kept_files.append(fname)
+        else:
+            skipped_by_query += 1
+    all_files = kept_files
+
+def scan_files(file_paths):
+    """Runs scan_file over file_paths, in order."""
+    # Header reads are dominated by file open/decompression latency, so run them on a
+    # thread pool. map() yields results in input order, keeping the grouping deterministic.
+    if opts.scan_workers > 1 and len(file_paths) > 1:
+        with ThreadPoolExecutor(max_workers=opts.scan_workers) as pool:
+            return list(pool.map(scan_file, file_paths))
+    return [scan_file(fname) for fname in file_paths]
+
+# With --sample-headers only one file per (directory, log name prefix) group is read; the
+# others are assumed to share its header and are verified later, during the query scan.
+# Files with a metadata cache entry are looked up exactly instead, as it's as cheap as sampling.
+assumed_files = set()
+if opts.sample_headers:
+    sample_groups = {}
+    files_to_scan = []
+    for fname in all_files:
+        if absolute_path(fname) in cache_entries:
+            files_to_scan.append(fname)
+        else:
+            sample_groups.setdefault(get_sample_group(fname), []).append(fname)
+    files_to_scan += [group_files[0] for group_files in sample_groups.values()]
+else:
+    files_to_scan = all_files
+
+t_scan = time.perf_counter()
+scanned_results = scan_files(files_to_scan)
+t_scan = time.perf_counter() - t_scan
+
+if opts.sample_headers:
+    sampled_metadata = dict(zip(files_to_scan, scanned_results))
+    scan_results = []
+    for fname in all_files:
+        if fname in sampled_metadata:
+            scan_results.append(sampled_metadata[fname])
+            continue
+        _, sample_meta, _ = sampled_metadata[sample_groups[get_sample_group(fname)][0]]
+        if all(sample_meta[:3]):
+            assumed_files.add(fname)
+        # No identity: assumed metadata is never written to the cache. #open is per file, so unknown.
+        scan_results.append((None, sample_meta[:3] + (None,) + sample_meta[4:], False))
+else:
+    scan_results = scanned_results
+
+def update_metadata_cache(file_paths, results):
+    """Writes the headers read (not looked up) for file_paths to the metadata cache."""
+    if cache_con is None:
+        return
+    # Only successfully parsed headers are cached, so unreadable files are retried next run
+    new_entries = [
+        (absolute_path(fname), *identity, json.dumps(meta))
+        for fname, (identity, meta, hit) in zip(file_paths, results)
+        if not hit and identity and all(meta[:3])
+    ]
+    try:
+        with cache_con:
+            cache_con.executemany("INSERT OR REPLACE INTO header_cache VALUES (?, ?, ?, ?, ?)", new_entries)
+    except sqlite3.Error as e:
+        print(f"[!] Warning: Could not update metadata cache: {e}", file=sys.stderr)
+
+cache_hits = sum(1 for _, _, hit in scanned_results if hit)
+cache_misses = len(scanned_results) - cache_hits
+update_metadata_cache(all_files, scan_results)
+
+def build_log_collections(all_files, scan_results):
+    """Groups files by log type and schema, applying query and #open time-window pruning.
+
+    Returns (log_collections, number of files pruned by their #open header).
+    """
+    # Dict structure: { "conn": { "compression|reader|fields_and_types": { "fields": [], "types": [], "compression": "gzip", "reader": {}, "files": [], "verify": False, "schemas": 1, "padded": False } } }
+    log_collections = {}
+    pruned_by_header = 0
+    if time_window:
+        # Nonstandard names fall back to #open: a file is assumed to run until the next file
+        # of the same log type in the same directory opens (or indefinitely, for the last one)
+        next_open = {}
+        opens_by_group = {}
+        for fname, (_, (l_path, _, _, open_ts, _, _), _) in zip(all_files, scan_results):
+            if file_ranges.get(fname) is None and open_ts is not None:
+                opens_by_group.setdefault((os.path.dirname(fname), l_path), []).append((open_ts, fname))
+        for opens in opens_by_group.values():
+            opens.sort()
+            for (_, fname), (following_ts, _) in zip(opens, opens[1:]):
+                next_open[fname] = following_ts
+
+    for fname, (_, (l_path, f_list, t_list, open_ts, compression, reader), _) in zip(all_files, scan_results):
+        if not all([l_path, f_list, t_list]): continue
+        if referenced_tables is not None and l_path.lower() not in referenced_tables: continue
+        if time_window and file_ranges.get(fname) is None and open_ts is not None:
+            if not overlaps_window(open_ts, next_open.get(fname, float('inf'))):
+                pruned_by_header += 1
+                continue
     
-    if l_path not in log_collections:
-        log_collections[l_path] = {}
+        if l_path not in log_collections:
+            log_collections[l_path] = {}
     
-    schema_key = "|".join(f_list)
-    if schema_key not in log_collections[l_path]:
-        log_collections[l_path][schema_key] = {'fields': f_list, 'types': t_list, 'files': []}
+        if compression not in DUCKDB_COMPRESSIONS and fsspec is None:
+            print(f"[!] Warning: Skipping {fname}: {compression} logs require the 'fsspec' package", file=sys.stderr)
+            continue
+        if os.path.abspath(fname) in archive_members and fsspec is None:
+            print(f"[!] Warning: Skipping {fname}: archive members require the 'fsspec' package", file=sys.stderr)
+            continue
+
+        # read_csv takes one set of options per call, so each codec and header format is read separately
+        schema_key = compression + "|" + json.dumps(reader, sort_keys=True) + "|" + json.dumps([f_list, t_list])
+        if schema_key not in log_collections[l_path]:
+            log_collections[l_path][schema_key] = {'fields': f_list, 'types': t_list, 'compression': compression, 'reader': reader,
+                                                   'files': [], 'verify': False, 'schemas': 1, 'padded': False}
     
-    log_collections[l_path][schema_key]['files'].append(fname)
+        log_collections[l_path][schema_key]['files'].append(fname)
+        # TSV groups verify their header lines during the scan (see find_header_mismatches()).
+        # JSON logs have none: a TSV file among them makes the strict read_json fail instead
+        if fname in assumed_files:
+            log_collections[l_path][schema_key]['verify'] = True
+    for l_path, schemas in log_collections.items():
+        log_collections[l_path] = consolidate_schemas(align_json_schemas(schemas))
+    return log_collections, pruned_by_header
+
+def align_json_schemas(schemas):
+    """Gives JSON schema groups the field types, and any missing fields, of the TSV groups of the same log type.
+
+    JSON values only hint at Zeek types (a time and a double are both numbers), while TSV
+    headers declare them, so this makes both formats produce identical column types.
+    """
+    tsv_types = {}
+    for info in schemas.values():
+        if info['reader']['format'] == 'tsv':
+            for f, t in zip(info['fields'], info['types']):
+                tsv_types.setdefault(f, t)
+    if not tsv_types:
+        return schemas
+    aligned = {}
+    for schema_key, info in schemas.items():
+        if info['reader']['format'] == 'json':
+            fields = info['fields'] + [f for f in tsv_types if f not in info['fields']]
+            types = [tsv_types.get(f, t) for f, t in zip(info['fields'], info['types'])] + [tsv_types[f] for f in fields[len(info['fields']):]]
+            schema_key = info['compression'] + "|" + json.dumps(info['reader'], sort_keys=True) + "|" + json.dumps([fields, types])
+            if schema_key in aligned:
+                aligned[schema_key]['files'].extend(info['files'])
+                aligned[schema_key]['schemas'] += info['schemas']
+                continue
+            info = dict(info, fields=fields, types=types)
+        aligned[schema_key] = info
+    return aligned
+
+def consolidate_schemas(schemas):
+    """Merges schema groups whose fields and types are a prefix of another group's into one read.
+
+    Zeek upgrades and scripts mostly append fields, so files with the shorter header can be read
+    with the longer column list and padded with NULLs instead of getting a read_csv of their own.
+    Groups with assumed headers are kept apart so their header lines can be verified exactly.
+    Without --tolerant, TSV groups are kept apart too: null_padding would also pad a truncated
+    row instead of rejecting it.
+    """
+    merged = {}
+    supersets = {}
+    for schema_key, info in sorted(schemas.items(), key=lambda item: -len(item[1]['fields'])):
+        if info['verify'] or (not opts.tolerant and info['reader']['format'] == 'tsv'):
+            merged[schema_key] = info
+            continue
+        read_key = (info['compression'], json.dumps(info['reader'], sort_keys=True))
+        width = len(info['fields'])
+        for superset in supersets.setdefault(read_key, []):
+            if superset['fields'][:width] == info['fields'] and superset['types'][:width] == info['types']:
+                superset['files'].extend(info['files'])
+                superset['schemas'] += info['schemas']
+                superset['padded'] = superset['padded'] or width < len(superset['fields'])
+                break
+        else:
+            supersets[read_key].append(info)
+            merged[schema_key] = info
+    for info in merged.values():
+        info['files'].sort()
+    return merged
+
+log_collections, pruned_by_header = build_log_collections(all_files, scan_results)
 
 t_metadata = time.perf_counter() - t0
-print(f"[*] Analyzed {len(all_files):,} files. Identified {len(log_collections)} log types in {t_metadata:.4f}s", file=sys.stderr)
+files_per_sec = len(files_to_scan) / t_scan if t_scan > 0 else 0.0
+print(f"[*] Analyzed {len(all_files):,} files. Identified {len(log_collections)} log types in {t_metadata:.4f}s ({files_per_sec:,.0f} files/s, {opts.scan_workers} workers)", file=sys.stderr)
+if cache_con is not None:
+    print(f"[*] Metadata cache: {cache_hits:,} hits, {cache_misses:,} misses", file=sys.stderr)
+if opts.sample_headers:
+    print(f"[*] Header sampling: read {len(files_to_scan):,} headers for {len(all_files):,} files, "
+          f"{len(assumed_files):,} assumed pending verification", file=sys.stderr)
+if referenced_tables is not None:
+    print(f"[*] Query references {', '.join(sorted(referenced_tables)) or 'no tables'}; "
+          f"skipped {skipped_by_query:,} files of other log types", file=sys.stderr)
+if time_window:
+    print(f"[*] Time window pruned {pruned_by_name + pruned_by_header:,} files "
+          f"({pruned_by_name:,} by archive name, {pruned_by_header:,} by #open header)", file=sys.stderr)
+
+def report_s3_requests(stage):
+    """Prints the object store requests made so far and resets the counters."""
+    with s3_stats_lock:
+        stats = dict(s3_stats)
+        s3_stats.update(dict.fromkeys(s3_stats, 0))
+    if any(stats.values()):
+        print(f"[*] S3 {stage}: {stats['LIST']:,} LIST, {stats['HEAD']:,} HEAD and {stats['GET']:,} GET requests, "
+              f"{stats['bytes']:,} bytes", file=sys.stderr)
+
+report_s3_requests("discovery and headers")
 
 # 3. Build Views for each Log Type
 t0 = time.perf_counter()
-con = duckdb.connect()
+if opts.db:
+    try:
+        con = duckdb.connect(opts.db)
+    except duckdb.Error as e:
+        print(f"[!] Error: Could not open database {opts.db}: {e}", file=sys.stderr)
+        sys.exit(1)
+else:
+    con = duckdb.connect()
+if fsspec is not None:
+    con.register_filesystem(DecompressingFileSystem())
 # Load INET extension for network queries
 try:
     con.execute("INSTALL inet;")
@@ -109,10 +1467,28 @@ try:
     con.execute("LOAD inet;")
 except:
     pass  # Extension might already be loaded
+# Integer form of an address: IPv6 as its 128-bit value, IPv4 as the IPv4-mapped IPv6 address
+# (::ffff:a.b.c.d), so both families sort in one space and a CIDR block is one contiguous range.
+# Embedded-IPv4 IPv6 notation other than plain IPv4 is not parsed. Macros, views and types are
+# temporary in a --db database, which only stores the tables
+con.execute("""
+    CREATE TEMP MACRO zeek_ip_int(a) AS CASE
+        WHEN NOT contains(a, ':') THEN (281470681743360 + list_reduce(
+            TRY_CAST(string_split(a, '.') AS UBIGINT[]), (acc, o) -> acc * 256 + o))::UHUGEINT
+        ELSE list_reduce(
+            list_transform(
+                list_filter(string_split(split_part(a, '::', 1), ':'), g -> g != '')
+                || list_transform(range(8 - len(list_filter(string_split(a, ':'), g -> g != ''))), i -> '0')
+                || list_filter(string_split(split_part(a, '::', 2), ':'), g -> g != ''),
+                g -> TRY_CAST('0x' || g AS UINTEGER)::UHUGEINT),
+            (acc, g) -> acc * 65536 + g)
+    END
+""")
+con.execute("CREATE TEMP MACRO zeek_ip_family(a) AS CASE WHEN contains(a, ':') THEN 6 WHEN a IS NOT NULL THEN 4 END::UTINYINT")
 type_map = {
-    # Time types
-    'time': 'DOUBLE',      # Unix timestamp with fractional seconds
-    'interval': 'DOUBLE',  # Duration in seconds
+    # Time types (read as epoch seconds, converted with convert_seconds())
+    'time': 'TIMESTAMP',   # UTC timestamp, microsecond precision
+    'interval': 'INTERVAL',  # Duration, microsecond precision
     
     # Numeric types
     'count': 'BIGINT',     # Unsigned 64-bit integer
@@ -130,120 +1506,1239 @@ type_map = {
     # String and other types default to VARCHAR
     # 'string', 'pattern', 'enum', 'table', 'set', 'vector', 'record' → VARCHAR
 }
+if opts.epoch_times:
+    type_map.update({'time': 'DOUBLE', 'interval': 'DOUBLE'})
+if opts.compact_types:
+    # TSV port values are bare numbers; the protocol is the record's own proto field
+    type_map.update({'count': 'UBIGINT', 'port': 'USMALLINT'})
 
-for log_type, schemas in log_collections.items():
-    select_statements = []
-    for info in schemas.values():
-        # Build column definitions - use proper types from type_map
-        # Note: read_csv doesn't support INET directly, so we read addr fields as VARCHAR and cast
-        col_defs = []
-        select_cols = []
-        for f, t in zip(info['fields'], info['types']):
-            db_type = type_map.get(t, 'VARCHAR')
-            
-            # Check if this is a container type (vector or set)
-            is_vector = t.startswith('vector[')
-            is_set = t.startswith('set[')
-            
-            if db_type == 'INET':
-                # Read as VARCHAR since read_csv doesn't support INET, then cast to INET
-                col_defs.append(f"'{f}': 'VARCHAR'")
-                select_cols.append(f"TRY_CAST(CASE WHEN \"{f}\" = '-' OR \"{f}\" = '(empty)' OR \"{f}\" IS NULL OR \"{f}\" = '' THEN NULL ELSE \"{f}\" END AS INET) AS \"{f}\"")
-            elif is_vector or is_set:
-                # Parse container types (vector/set) into DuckDB LIST type
-                # Zeek format: vector[string] -> [value1,value2] or set[addr] -> {value1,value2}
-                # Extract element type
-                if is_vector:
-                    elem_type = t[7:-1]  # Remove 'vector[' and ']'
-                    bracket_start, bracket_end = '[', ']'
-                else:  # is_set
-                    elem_type = t[4:-1]  # Remove 'set[' and ']'
-                    bracket_start, bracket_end = '{', '}'
-                
-                # Map element type to DuckDB type
-                elem_db_type = type_map.get(elem_type, 'VARCHAR')
-                
-                # Read as VARCHAR, then parse and convert to LIST
-                col_defs.append(f"'{f}': 'VARCHAR'")
-                
-                # Parse the serialized format: remove brackets and split by comma
-                # DuckDB's string_split returns a list, which we can use directly
-                # For INET arrays, we'll need to cast each element separately
-                if elem_db_type == 'INET':
-                    # For arrays of IPs: split, then cast each element to INET
-                    select_cols.append(f"""
-                        CASE 
-                            WHEN "{f}" = '-' OR "{f}" = '(empty)' OR "{f}" IS NULL OR "{f}" = '' THEN NULL
-                            WHEN "{f}" = '{bracket_start}{bracket_end}' THEN NULL
-                            ELSE list_transform(
-                                string_split(
-                                    REPLACE(REPLACE(TRIM("{f}"), '{bracket_start}', ''), '{bracket_end}', ''),
-                                    ','
-                                ),
-                                x -> TRY_CAST(TRIM(x) AS INET)
-                            )
-                        END AS "{f}"
-                    """)
-                else:
-                    # For other types, split and optionally cast
-                    if elem_db_type != 'VARCHAR':
-                        select_cols.append(f"""
-                            CASE 
-                                WHEN "{f}" = '-' OR "{f}" IS NULL OR "{f}" = '' THEN NULL
-                                WHEN "{f}" = '{bracket_start}{bracket_end}' THEN NULL
-                                ELSE list_transform(
-                                    string_split(
-                                        REPLACE(REPLACE(TRIM("{f}"), '{bracket_start}', ''), '{bracket_end}', ''),
-                                        ','
-                                    ),
-                                    x -> TRY_CAST(TRIM(x) AS {elem_db_type})
-                                )
-                            END AS "{f}"
-                        """)
-                    else:
-                        # For VARCHAR, just split (no casting needed)
-                        select_cols.append(f"""
-                            CASE 
-                                WHEN "{f}" = '-' OR "{f}" IS NULL OR "{f}" = '' THEN NULL
-                                WHEN "{f}" = '{bracket_start}{bracket_end}' THEN NULL
-                                ELSE string_split(
-                                    REPLACE(REPLACE(TRIM("{f}"), '{bracket_start}', ''), '{bracket_end}', ''),
-                                    ','
-                                )
-                            END AS "{f}"
-                        """)
+# Compact mode stores enum fields with at most this many distinct values as DuckDB ENUMs
+ENUM_MAX_VALUES = 4096
+
+# Files listed per log type in the skipped-rows summary
+REJECTED_FILES_SHOWN = 20
+
+# Bytes at the end of a plain log searched for its half-written last line (see is_in_progress_line())
+IN_PROGRESS_TAIL_BYTES = 1 << 20
+
+# Bump whenever the columns or rows written to the Parquet cache change; older entries are converted again
+PARQUET_CACHE_VERSION = 2
+
+# Rows per row group of Z-ordered compacted files: a row group's statistics only narrow both
+# ts and id.orig_h once a day spans enough row groups to follow the curve
+ZORDER_ROW_GROUP_SIZE = 16384
+
+# Schema of a --db database holding one table per log type, the log_files manifest and settings
+DB_SCHEMA = 'zeek'
+
+# Bump whenever the tables of a --db database change shape; older databases are refused
+DB_VERSION = 1
+
+# Zeek writes time and interval values as fractional seconds
+SECONDS_TYPES = ('time', 'interval')
+
+def convert_seconds(expr, zeek_type):
+    """Converts a DOUBLE expression holding Zeek seconds to the type type_map gives zeek_type."""
+    # to_seconds() rounds to microseconds; it's several times faster than casting the
+    # scaled double to BIGINT for make_timestamp(), and unlike to_timestamp() it needs no time zone
+    if type_map[zeek_type] == 'TIMESTAMP':
+        return f"(TIMESTAMP '1970-01-01' + to_seconds({expr}))"
+    if type_map[zeek_type] == 'INTERVAL':
+        return f"to_seconds({expr})"
+    return expr
+
+def sql_string(value):
+    """Quotes value as a SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+def sql_identifier(value):
+    """Quotes value as a SQL identifier."""
+    return '"' + value.replace('"', '""') + '"'
+
+def build_schema_select(info, files_variable, enum_types, for_cache=False):
+    """Returns the SELECT statement reading one schema group's files, listed in files_variable.
+
+    Fields named in enum_types are cast to the ENUM type it maps them to. With for_cache, the
+    columns are those stored in the Parquet cache and --db tables: addresses stay text,
+    intervals stay seconds and the time window isn't applied (see build_stored_select()).
+    """
+    reader = info['reader']
+    unset = sql_string(reader['unset_field'])
+    empty = sql_string(reader['empty_field'])
+    set_separator = sql_string(reader['set_separator'])
+
+    def seconds_expr(expr, zeek_type):
+        # Parquet only keeps intervals to the millisecond, so the cache stores their seconds
+        return expr if for_cache and zeek_type == 'interval' else convert_seconds(expr, zeek_type)
+
+    # Build column definitions - use proper types from type_map
+    # Note: read_csv doesn't support INET directly, so we read addr fields as VARCHAR and cast
+    col_defs = []
+    select_cols = []
+    raw_exprs = {}
+    for f, t in zip(info['fields'], info['types']):
+        db_type = type_map.get(t, 'VARCHAR')
+
+        # Check if this is a container type (vector or set)
+        is_vector = t.startswith('vector[')
+        is_set = t.startswith('set[')
+
+        if db_type == 'INET':
+            # Read as VARCHAR since read_csv doesn't support INET, then cast to INET
+            # (unset values are already NULL via nullstr)
+            col_defs.append(f"'{f}': 'VARCHAR'")
+            address = f"NULLIF(NULLIF(\"{f}\", {empty}), '')"
+            select_cols.append(f"{address if for_cache else f'TRY_CAST({address} AS INET)'} AS \"{f}\"")
+            if opts.ip_ints and t == 'addr' and not for_cache:
+                select_cols.append(f"zeek_ip_int({address}) AS \"{f}_int\"")
+                select_cols.append(f"zeek_ip_family({address}) AS \"{f}_family\"")
+        elif is_vector or is_set:
+            # Parse container types (vector/set) into DuckDB LIST type
+            # Zeek TSV writes the elements joined by #set_separator, with no brackets; an empty
+            # container is the #empty_field value and an unset one is already NULL via nullstr.
+            # Unreferenced view columns are pruned, so this only runs for queries that use the field
+            elem_type = t[t.index('[') + 1:-1]  # 'vector[addr]' -> 'addr'
+            elem_db_type = type_map.get(elem_type, 'VARCHAR')
+
+            # Read as VARCHAR, then split with a single string_split
+            col_defs.append(f"'{f}': 'VARCHAR'")
+            items = f"string_split(NULLIF(\"{f}\", {empty}), {set_separator})"
+            if elem_type in SECONDS_TYPES:
+                select_cols.append(f"list_transform({items}, x -> {seconds_expr('TRY_CAST(x AS DOUBLE)', elem_type)}) AS \"{f}\"")
+            elif elem_db_type != 'VARCHAR' and not (for_cache and elem_db_type == 'INET'):
+                select_cols.append(f"list_transform({items}, x -> TRY_CAST(x AS {elem_db_type})) AS \"{f}\"")
+            else:
+                select_cols.append(f"{items} AS \"{f}\"")
+        elif t in SECONDS_TYPES:
+            # Times and intervals are read as seconds and converted; raw_exprs keeps the
+            # seconds value for the time window filter
+            col_defs.append(f"'{f}': 'DOUBLE'")
+            raw_exprs[f] = f"\"{f}\""
+            select_cols.append(f"{seconds_expr(raw_exprs[f], t)} AS \"{f}\"")
+        else:
+            # Use the mapped type directly for other fields
+            col_defs.append(f"'{f}': '{db_type}'")
+            if f in enum_types:
+                select_cols.append(f"CAST(\"{f}\" AS {sql_identifier(enum_types[f])}) AS \"{f}\"")
             else:
-                # Use the mapped type directly for other fields
-                col_defs.append(f"'{f}': '{db_type}'")
                 select_cols.append(f"\"{f}\"")
-        
-        col_def = ", ".join(col_defs)
-        
-        select_statements.append(f"""
-            SELECT {', '.join(select_cols)}, '{info['files'][0]}' as schema_source 
-            FROM read_csv({str(info['files'])}, delim='\\t', skip=8, header=false, columns={{{col_def}}}, nullstr='-', ignore_errors=True)
-        """)
-    
+
+    col_def = ", ".join(col_defs)
+    scan_compression = info['compression'] if info['compression'] in DUCKDB_COMPRESSIONS else 'none'
+
+    conditions = []
+    if info['padded']:
+        # With null_padding the two-value '#close' trailer is padded into a row rather than
+        # rejected for its missing columns. Parsing its first column rejects it unless that's
+        # text, and DuckDB only parses the columns a query uses, so the filter always reads it
+        conditions.append(f"CAST(\"{info['fields'][0]}\" AS VARCHAR) IS DISTINCT FROM '#close'")
+    # Files are pruned at file granularity; trim rows at the window edges as well
+    if time_window and 'ts' in info['fields'] and not for_cache:
+        ts_expr = raw_exprs.get('ts', '"ts"')
+        if opts.since is not None:
+            conditions.append(f"{ts_expr} >= {opts.since}")
+        if opts.until is not None:
+            conditions.append(f"{ts_expr} < {opts.until}")
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    # Zeek TSV is never quoted or escaped, and every dialect setting comes from the header,
+    # so the CSV sniffer is disabled
+    reader_options = (f"delim={sql_string(reader['separator'])}, header=false, auto_detect=false, quote='', escape='', "
+                      f"nullstr={unset}, compression='{scan_compression}'")
+    if info['verify']:
+        # Start at the #fields line so each file's #fields/#types lines are rejected into
+        # reject_errors, where find_header_mismatches() compares them with the assumed schema
+        reader_options += f", skip={reader['header_lines'] - 2}"
+    else:
+        reader_options += f", skip={reader['header_lines']}"
+        if info['padded']:
+            # Files with the shorter header of a consolidated group lack the trailing columns.
+            # This also pads short rows, which is why groups are only consolidated with --tolerant
+            reader_options += ", null_padding=true"
+    # Like ignore_errors, but the skipped rows, the '#close' trailer included, are recorded in
+    # reject_errors. Without --tolerant, check_malformed_rows() then fails on any that isn't a
+    # header or trailer line; with it, report_rejected_rows() counts them. This costs next to
+    # nothing unless rows are rejected
+    reader_options += ", store_rejects=true"
+
+    return f"""
+        SELECT {', '.join(select_cols)}, ({info['first_file_id']} + file_index)::INTEGER AS file_id
+        FROM read_csv(getvariable({sql_string(files_variable)}), columns={{{col_def}}}, {reader_options})
+        {where_clause}
+    """
+
+def build_json_select(info, files_variable, enum_types, for_cache=False):
+    """Returns the SELECT statement reading one schema group of Zeek JSON logs, listed in files_variable.
+
+    Columns get the same DuckDB types as in TSV logs; fields a record leaves out are NULL.
+    for_cache is as for build_schema_select().
+    """
+    iso_times = info['reader']['time_format'] == 'iso8601'
+
+    def seconds_read_type(zeek_type):
+        return 'TIMESTAMP' if iso_times and zeek_type == 'time' else 'DOUBLE'
+
+    def seconds_expr(expr, zeek_type):
+        # ISO 8601 times are parsed by read_json itself
+        if iso_times and zeek_type == 'time':
+            return expr if type_map['time'] == 'TIMESTAMP' else f"epoch({expr})"
+        if for_cache and zeek_type == 'interval':
+            return expr  # As in build_schema_select()
+        return convert_seconds(expr, zeek_type)
+
+    col_defs = []
+    select_cols = []
+    raw_exprs = {}
+    for f, t in zip(info['fields'], info['types']):
+        db_type = type_map.get(t, 'VARCHAR')
+        if db_type == 'INET':
+            col_defs.append(f"'{f}': 'VARCHAR'")
+            address = f"NULLIF(\"{f}\", '')"
+            select_cols.append(f"{address if for_cache else f'TRY_CAST({address} AS INET)'} AS \"{f}\"")
+            if opts.ip_ints and t == 'addr' and not for_cache:
+                select_cols.append(f"zeek_ip_int({address}) AS \"{f}_int\"")
+                select_cols.append(f"zeek_ip_family({address}) AS \"{f}_family\"")
+        elif t.startswith('vector[') or t.startswith('set['):
+            # JSON arrays are read as lists directly; empty ones are NULL, as in TSV logs
+            elem_type = t[t.index('[') + 1:-1]
+            elem_db_type = type_map.get(elem_type, 'VARCHAR')
+            if elem_type in SECONDS_TYPES:
+                col_defs.append(f"'{f}': '{seconds_read_type(elem_type)}[]'")
+                items = f"list_transform(\"{f}\", x -> {seconds_expr('x', elem_type)})"
+            elif elem_db_type == 'INET':
+                col_defs.append(f"'{f}': 'VARCHAR[]'")
+                items = f"\"{f}\"" if for_cache else f"list_transform(\"{f}\", x -> TRY_CAST(x AS INET))"
+            else:
+                col_defs.append(f"'{f}': '{elem_db_type}[]'")
+                items = f"\"{f}\""
+            select_cols.append(f"CASE WHEN len(\"{f}\") > 0 THEN {items} END AS \"{f}\"")
+        elif t in SECONDS_TYPES:
+            col_defs.append(f"'{f}': '{seconds_read_type(t)}'")
+            column = f"\"{f}\""
+            raw_exprs[f] = f"epoch({column})" if iso_times and t == 'time' else column
+            select_cols.append(f"{seconds_expr(column, t)} AS {column}")
+        else:
+            col_defs.append(f"'{f}': '{db_type}'")
+            if f in enum_types:
+                select_cols.append(f"CAST(\"{f}\" AS {sql_identifier(enum_types[f])}) AS \"{f}\"")
+            else:
+                select_cols.append(f"\"{f}\"")
+
+    conditions = []
+    # Files are pruned at file granularity; trim rows at the window edges as well
+    if time_window and 'ts' in info['fields'] and not for_cache:
+        if opts.since is not None:
+            conditions.append(f"{raw_exprs['ts']} >= {opts.since}")
+        if opts.until is not None:
+            conditions.append(f"{raw_exprs['ts']} < {opts.until}")
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    # read_json spells read_csv's 'none' as 'uncompressed'
+    scan_compression = info['compression'] if info['compression'] in DUCKDB_COMPRESSIONS - {'none'} else 'uncompressed'
+    reader_options = f"format='newline_delimited', compression='{scan_compression}'"
+    if opts.tolerant and not info['verify']:
+        # With assumed headers, a TSV file taken for JSON must fail the read, not be skipped
+        # silently, so its group is re-planned; the re-run then skips malformed records
+        reader_options += ", ignore_errors=true"
+
+    return f"""
+        SELECT {', '.join(select_cols)}, ({info['first_file_id']} + file_index)::INTEGER AS file_id
+        FROM read_json(getvariable({sql_string(files_variable)}), columns={{{', '.join(col_defs)}}}, {reader_options})
+        {where_clause}
+    """
+
+def build_stored_select(info, source, file_id, enum_types):
+    """Returns the SELECT statement reading rows stored with build_schema_select()'s for_cache columns from source.
+
+    The stored columns already have their view types, except addresses and intervals, which
+    are stored as text and seconds and converted here. Fields missing from info['stored_fields']
+    are NULL. file_id is the expression giving each row's file id.
+    """
+    select_cols = []
+    for f, t in zip(info['fields'], info['types']):
+        db_type = type_map.get(t, 'VARCHAR')
+        if f not in info['stored_fields']:
+            # A typed NULL keeps the view's column order, like the group's other reads
+            if f in enum_types:
+                db_type = sql_identifier(enum_types[f])
+            elif t.startswith('vector[') or t.startswith('set['):
+                db_type = type_map.get(t[t.index('[') + 1:-1], 'VARCHAR') + '[]'
+            select_cols.append(f"NULL::{db_type} AS \"{f}\"")
+            if opts.ip_ints and t == 'addr':
+                select_cols.append(f"NULL::UHUGEINT AS \"{f}_int\"")
+                select_cols.append(f"NULL::UTINYINT AS \"{f}_family\"")
+            continue
+        if db_type == 'INET':
+            select_cols.append(f"TRY_CAST(\"{f}\" AS INET) AS \"{f}\"")
+            if opts.ip_ints and t == 'addr':
+                select_cols.append(f"zeek_ip_int(\"{f}\") AS \"{f}_int\"")
+                select_cols.append(f"zeek_ip_family(\"{f}\") AS \"{f}_family\"")
+        elif t == 'interval':
+            select_cols.append(f"{convert_seconds(sql_identifier(f), t)} AS \"{f}\"")
+        elif t in ('vector[addr]', 'set[addr]', 'vector[subnet]', 'set[subnet]'):
+            select_cols.append(f"list_transform(\"{f}\", x -> TRY_CAST(x AS INET)) AS \"{f}\"")
+        elif t in ('vector[interval]', 'set[interval]'):
+            select_cols.append(f"list_transform(\"{f}\", x -> {convert_seconds('x', 'interval')}) AS \"{f}\"")
+        elif f in enum_types:
+            select_cols.append(f"CAST(\"{f}\" AS {sql_identifier(enum_types[f])}) AS \"{f}\"")
+        else:
+            select_cols.append(f"\"{f}\"")
+
+    conditions = []
+    # Rows are stored sorted by ts, so these also skip row groups outside the window
+    if time_window and 'ts' in info['stored_fields']:
+        if opts.since is not None:
+            conditions.append(f"\"ts\" >= {convert_seconds(repr(opts.since), 'time')}")
+        if opts.until is not None:
+            conditions.append(f"\"ts\" < {convert_seconds(repr(opts.until), 'time')}")
+    where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    return f"""
+        SELECT {', '.join(select_cols)}, {file_id} AS file_id
+        FROM {source}
+        {where_clause}
+    """
+
+def build_parquet_select(info, files_variable, enum_types):
+    """Returns the SELECT statement reading one group's Parquet cache files, listed in files_variable.
+
+    Rows of a compacted file carry their member index in zeek_member. The files_variable:members
+    variable lists each compacted file's members in turn, starting at its entry in
+    files_variable:offsets, as the position of the member's source in the read's files, or NULL
+    for members the read doesn't cover.
+    """
+    source = f"read_parquet(getvariable({sql_string(files_variable)}), union_by_name=true, hive_partitioning=false)"
+    if 'member_ids' in info:
+        member_ids, member_offsets = (f"getvariable({sql_string(f'{files_variable}:{name}')})" for name in ('members', 'offsets'))
+        file_id = f"({info['first_file_id']} + {member_ids}[{member_offsets}[file_index::INTEGER + 1] + zeek_member + 1])::INTEGER"
+        # Only filtered when some member is left out: unused, the file id isn't even computed
+        where_clause = f"WHERE {file_id} IS NOT NULL" if None in info['member_ids'] else ""
+        source = f"(SELECT *, {file_id} AS zeek_file_id FROM {source} {where_clause})"
+        return build_stored_select(info, source, 'zeek_file_id', enum_types)
+    return build_stored_select(info, source, f"({info['first_file_id']} + file_index)::INTEGER", enum_types)
+
+def build_table_select(info, files_variable, enum_types):
+    """Returns the SELECT statement reading a log type's table in the --db database.
+
+    files_variable is unused: the table holds every ingested file, filtered by --files-where.
+    """
+    source = f"{DB_SCHEMA}.{sql_identifier(info['table'])}"
+    if opts.files_where:
+        source = f"(SELECT * FROM {source} WHERE file_id IN (SELECT file_id FROM {DB_SCHEMA}.{FILES_TABLE} WHERE {opts.files_where}))"
+    return build_stored_select(info, source, 'file_id', enum_types)
+
+def convert_to_parquet(log_type, fname, info, cache_name):
+    """Writes one file's rows, sorted by ts, to the Parquet cache and returns the cache file's path."""
+    builder = get_select_builder(info)
+    con.execute("SET VARIABLE zeek_cache_source = [?]", [get_scan_path(fname, info['compression'])])
+    select = builder(info, 'zeek_cache_source', {}, for_cache=True)
+    order = 'ORDER BY "ts"' if 'ts' in info['fields'] else ''
+    temp_path = os.path.join(opts.parquet_cache, f".{cache_name}.{os.getpid()}.tmp")
+    try:
+        after_scan = last_reject_scan()
+        con.execute(f"COPY (SELECT * EXCLUDE (file_id) FROM ({select}) {order}) TO {sql_string(temp_path)} (FORMAT parquet, COMPRESSION zstd)")
+        check_malformed_rows(after_scan)
+        # Partitioned by the UTC day of the first record; the minimum comes from the Parquet statistics
+        day = None
+        if 'ts' in info['fields'] and info['types'][info['fields'].index('ts')] == 'time':
+            first_ts = 'min("ts")' if type_map['time'] == 'TIMESTAMP' else "TIMESTAMP '1970-01-01' + to_seconds(min(\"ts\"))"
+            (day,) = con.execute(f"SELECT strftime({first_ts}, '%Y-%m-%d') FROM read_parquet({sql_string(temp_path)})").fetchone()
+        cache_path = os.path.join(opts.parquet_cache, log_type, f"date={day or 'unknown'}", cache_name)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        os.replace(temp_path, cache_path)
+        return cache_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def read_compacted_members(paths):
+    """Returns ({compacted file: members}, {compacted file: row order}) from the files' Parquet metadata.
+
+    members lists the [path hash, state hash] pairs of the cache entries merged into the file, indexed
+    by each row's zeek_member. Unreadable files are left out, so their members are converted again.
+    """
+    members_of, order_of = {}, {}
+    for path in paths:
+        try:
+            metadata = dict(con.execute("SELECT decode(key), decode(value) FROM parquet_kv_metadata(?)", [path]).fetchall())
+        except duckdb.Error as e:
+            print(f"[!] Warning: Could not read compacted Parquet cache file {path}: {str(e).splitlines()[0]}", file=sys.stderr)
+            continue
+        if 'zeek_members' in metadata:
+            members_of[path] = json.loads(metadata['zeek_members'])
+            order_of[path] = metadata.get('zeek_order')
+    return members_of, order_of
+
+def compact_parquet_day(log_type, day_dir, inputs, members, order):
+    """Merges Parquet cache files of one day into a compacted file and returns its path.
+
+    inputs is a list of (cache file, member map): the map gives, per member index of a compacted
+    file, or as its single entry for a per-file copy, the rows' member index in the new file, or
+    None to drop them. members lists the new file's [path hash, state hash] pairs. order is 'ts',
+    'z' to interleave the bits of the ts and id.orig_h ranks, or 'none' for logs without ts.
+    """
+    con.execute("SET VARIABLE zeek_compact_inputs = string_split(?, chr(0))", ["\0".join(path for path, _ in inputs)])
+    con.execute("SET VARIABLE zeek_compact_members = CAST(json(?) AS INTEGER[][])", [json.dumps([index_map for _, index_map in inputs])])
+    # Per-file copies have no zeek_member column, which union_by_name reads as NULL
+    has_members = any(path.endswith('.compact.parquet') for path, _ in inputs)
+    member = 'coalesce(zeek_member, 0)' if has_members else '0'
+    rows = f"""
+        SELECT * FROM (
+            SELECT * {'EXCLUDE (zeek_member)' if has_members else ''},
+                   getvariable('zeek_compact_members')[file_index::INTEGER + 1][{member} + 1] AS zeek_member
+            FROM read_parquet(getvariable('zeek_compact_inputs'), union_by_name=true, hive_partitioning=false))
+        WHERE zeek_member IS NOT NULL
+    """
+    row_group_size = ''
+    if order == 'z':
+        # Ranks scaled to 16 bits; the bits interleave with ts taking the higher bit of each pair.
+        # Addresses rank by their text, which is what the stored column's statistics compare
+        interleaved = ' | '.join(f"(((zeek_ts_rank >> {i}) & 1) << {2 * i + 1}) | (((zeek_host_rank >> {i}) & 1) << {2 * i})"
+                                 for i in range(16))
+        rows = f"""
+            SELECT * EXCLUDE (zeek_ts_rank, zeek_host_rank) FROM (
+                SELECT *, (percent_rank() OVER (ORDER BY "ts") * 65535)::BIGINT AS zeek_ts_rank,
+                          (percent_rank() OVER (ORDER BY "id.orig_h") * 65535)::BIGINT AS zeek_host_rank
+                FROM ({rows}))
+            ORDER BY {interleaved}
+        """
+        row_group_size = f", ROW_GROUP_SIZE {ZORDER_ROW_GROUP_SIZE}"
+    elif order == 'ts':
+        rows = f'SELECT * FROM ({rows}) ORDER BY "ts"'
+
+    digest = hashlib.sha256(json.dumps([members, order]).encode()).hexdigest()[:16]
+    name = f"{log_type}.{os.path.basename(day_dir).split('=', 1)[-1]}.{digest}.compact.parquet"
+    temp_path = os.path.join(opts.parquet_cache, f".{name}.{os.getpid()}.tmp")
+    metadata = f"{{zeek_members: {sql_string(json.dumps(members))}, zeek_order: {sql_string(order)}}}"
+    try:
+        con.execute(f"COPY ({rows}) TO {sql_string(temp_path)} (FORMAT parquet, COMPRESSION zstd{row_group_size}, KV_METADATA {metadata})")
+        compacted_path = os.path.join(day_dir, name)
+        os.replace(temp_path, compacted_path)
+        return compacted_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def compact_parquet_reads(cached_reads, locations, file_keys, members_of, order_of):
+    """Merges each read's cached files of one day into one compacted file, for --compact.
+
+    cached_reads is a list of (log type, read info, cached files). locations maps each cached file
+    to (cache file, member index or None) and is updated to point into the compacted files. A
+    compacted input keeps the rows of members this run didn't look up; members whose source was
+    found elsewhere, e.g. converted again after it changed, are dropped, so no rows appear twice.
+    """
+    located_sources = {file_keys[fname][0]: location for fname, location in locations.items()}
+    inputs_merged = written = failed = 0
+    t1 = time.perf_counter()
+    for log_type, info, fnames in cached_reads:
+        if 'ts' not in info['fields']:
+            order = 'none'
+        else:
+            order = 'z' if opts.z_order and 'id.orig_h' in info['fields'] else 'ts'
+        days = {}
+        for fname in fnames:
+            days.setdefault(os.path.dirname(locations[fname][0]), []).append(fname)
+        for day_dir, day_files in days.items():
+            paths = list(dict.fromkeys(locations[fname][0] for fname in day_files))
+            # A day already in one file is only rewritten to Z-order it
+            if len(paths) == 1 and (order != 'z' or order_of.get(paths[0]) == 'z'):
+                continue
+            members, inputs = [], []
+            for path in paths:
+                index_map = []
+                if path in members_of:
+                    for m, (source, state) in enumerate(members_of[path]):
+                        if located_sources.get(source, (path, m)) == (path, m):
+                            index_map.append(len(members))
+                            members.append([source, state])
+                        else:
+                            index_map.append(None)
+                else:
+                    fname = next(fname for fname in day_files if locations[fname][0] == path)
+                    index_map.append(len(members))
+                    members.append(list(file_keys[fname]))
+                inputs.append((path, index_map))
+            try:
+                compacted_path = compact_parquet_day(log_type, day_dir, inputs, members, order)
+            except (duckdb.Error, OSError) as e:
+                print(f"[!] Warning: Could not compact Parquet cache files in {day_dir}: {str(e).splitlines()[0]}", file=sys.stderr)
+                failed += 1
+                continue
+            index_maps = dict(inputs)
+            for fname, (path, m) in locations.items():
+                if path in index_maps:
+                    locations[fname] = (compacted_path, index_maps[path][m or 0])
+                    located_sources[file_keys[fname][0]] = locations[fname]
+            members_of[compacted_path], order_of[compacted_path] = members, order
+            for path in paths:
+                members_of.pop(path, None)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            inputs_merged += len(paths)
+            written += 1
+    print(f"[*] Compacted {inputs_merged:,} Parquet cache files into {written:,} day files in {time.perf_counter() - t1:.2f}s"
+          f"{f', {failed:,} days failed' if failed else ''}", file=sys.stderr)
+
+def materialize_parquet(log_collections):
+    """Reads files from the --parquet-cache directory, converting those without a fresh copy first.
+
+    A cache file is named <file name>.<path hash>.<state hash>.parquet, where the state hash covers
+    the source's identity and header and the options that shape the columns; an entry whose state
+    differs is stale and replaced. A file merged by --compact is found through the member list of
+    its compacted file instead. Files without an identity (standard input, assumed headers) and
+    files that fail to convert are read as before. Each read's cached files are split off into
+    reads of their own, one for per-file copies and one for compacted files. Returns True if any
+    read was split.
+    """
+    try:
+        os.makedirs(opts.parquet_cache, exist_ok=True)
+    except OSError as e:
+        print(f"[!] Warning: Parquet cache {opts.parquet_cache} unavailable: {e}", file=sys.stderr)
+        return False
+    entries, compacted_paths = {}, []
+    for dir_path, _, names in os.walk(opts.parquet_cache):
+        for name in names:
+            if name.endswith('.compact.parquet'):
+                compacted_paths.append(os.path.join(dir_path, name))
+                continue
+            parts = name.rsplit('.', 3)
+            if len(parts) == 4 and parts[3] == 'parquet':
+                entries.setdefault(parts[1], []).append((parts[2], os.path.join(dir_path, name)))
+    members_of, order_of = read_compacted_members(compacted_paths)
+    compacted = {}
+    for path, members in members_of.items():
+        for m, (source, state) in enumerate(members):
+            compacted.setdefault(source, []).append((state, path, m))
+
+    metadata = dict(zip(all_files, scan_results))
+    fresh = converted = failed = 0
+    t_convert = 0.0
+    # Where each cached file's rows are: (cache file, member index of a compacted file or None)
+    locations, file_keys, cached_reads, raw_reads = {}, {}, [], {}
+    for log_type, reads in log_collections.items():
+        for schema_key, info in reads.items():
+            group_types = dict(zip(info['fields'], info['types']))
+            cached_files, raw_files = [], []
+            for fname in info['files']:
+                identity, (_, f_list, _, _, _, _), _ = metadata[fname]
+                if identity is None or fname in assumed_files:
+                    raw_files.append(fname)
+                    continue
+                # Each file keeps its own fields, with the types its group settled on (see align_json_schemas())
+                types = [group_types[f] for f in f_list]
+                source = hashlib.sha256(absolute_path(fname).encode()).hexdigest()[:16]
+                state = hashlib.sha256(json.dumps([
+                    PARQUET_CACHE_VERSION, identity, f_list, types, info['reader'], info['compression'],
+                    sorted(type_map.items()), opts.tolerant,
+                ]).encode()).hexdigest()[:16]
+                cache_path = next((path for entry_state, path in entries.get(source, []) if entry_state == state), None)
+                location = (cache_path, None) if cache_path else \
+                    next(((path, m) for entry_state, path, m in compacted.get(source, []) if entry_state == state), None)
+                if location:
+                    fresh += 1
+                else:
+                    t1 = time.perf_counter()
+                    try:
+                        cache_path = convert_to_parquet(log_type, fname, dict(info, fields=f_list, types=types, files=[fname],
+                                                                             first_file_id=0, verify=False, padded=False),
+                                                        f"{os.path.basename(fname)}.{source}.{state}.parquet")
+                        converted += 1
+                    except (duckdb.Error, OSError) as e:
+                        print(f"[!] Warning: Could not cache {fname} as Parquet: {str(e).splitlines()[0]}", file=sys.stderr)
+                        failed += 1
+                        raw_files.append(fname)
+                        continue
+                    finally:
+                        t_convert += time.perf_counter() - t1
+                    # Rows of an older state in a compacted file no longer match, so they're never read
+                    for entry_state, path in entries.get(source, []):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                    entries[source] = [(state, cache_path)]
+                    location = (cache_path, None)
+                locations[fname] = location
+                file_keys[fname] = (source, state)
+                cached_files.append(fname)
+            raw_reads[(log_type, schema_key)] = raw_files
+            if cached_files:
+                cached_reads.append((log_type, schema_key, info, cached_files))
+    print(f"[*] Parquet cache: {fresh:,} fresh, {converted:,} converted in {t_convert:.2f}s, {failed:,} failed", file=sys.stderr)
+    if opts.compact:
+        compact_parquet_reads([(log_type, info, fnames) for log_type, _, info, fnames in cached_reads],
+                              locations, file_keys, members_of, order_of)
+
+    cached = {(log_type, schema_key): fnames for log_type, schema_key, _, fnames in cached_reads}
+    split = False
+    for log_type, reads in log_collections.items():
+        split_reads = {}
+        for schema_key, info in reads.items():
+            raw_files = raw_reads[(log_type, schema_key)]
+            if raw_files:
+                split_reads[schema_key] = dict(info, files=raw_files)
+            if (log_type, schema_key) not in cached:
+                continue
+            split = True
+            fnames = cached[(log_type, schema_key)]
+            file_copies = [fname for fname in fnames if locations[fname][1] is None]
+            members = [fname for fname in fnames if locations[fname][1] is not None]
+            # The raw read, when there is one, keeps the schema count, else the first split read
+            keep_schemas = not raw_files
+            for suffix, files in (('|parquet', file_copies), ('|compact', members)):
+                if not files:
+                    continue
+                fields = {f for fname in files for f in metadata[fname][1][1]}
+                split_info = dict(info, files=files, parquet=list(dict.fromkeys(locations[fname][0] for fname in files)),
+                                  verify=False, padded=False, stored_fields=[f for f in info['fields'] if f in fields],
+                                  schemas=info['schemas'] if keep_schemas else 0)
+                keep_schemas = False
+                if suffix == '|compact':
+                    # Files ordered like the compacted rows' members, then the position in files of
+                    # each member's source, if this read has it, compacted file after compacted file
+                    path_order = {path: k for k, path in enumerate(split_info['parquet'])}
+                    files.sort(key=lambda fname: (path_order[locations[fname][0]], locations[fname][1]))
+                    positions = {locations[fname]: i for i, fname in enumerate(files)}
+                    split_info['member_ids'], split_info['member_offsets'] = [], []
+                    for path in split_info['parquet']:
+                        split_info['member_offsets'].append(len(split_info['member_ids']))
+                        split_info['member_ids'].extend(positions.get((path, m)) for m in range(len(members_of[path])))
+                split_reads[schema_key + suffix] = split_info
+        log_collections[log_type] = split_reads
+    return split
+
+def select_file_rows(files):
+    """Returns (SELECT statement, parameters) giving the log_files rows of files, a list of (path, log type, scan result).
+
+    file_id numbers the rows from 0. Besides the log_files columns there are inode and mtime_ns,
+    which complete the file's identity (see get_file_identity()).
+    """
+    columns = {name: [] for name in ('path', 'log_path', 'inode', 'size', 'mtime_ns', 'open_time', 'compression', 'schema')}
+    schemas = {}
+    for path, log_type, (identity, (_, f_list, t_list, open_ts, compression, _), _) in files:
+        inode, size, mtime_ns = identity or (None, None, None)
+        # Header metadata is stored once per distinct schema and looked up by index
+        schema_index = schemas.setdefault(json.dumps([f_list, t_list]), len(schemas))
+        columns['path'].append(path)
+        columns['log_path'].append(log_type)
+        columns['inode'].append('' if inode is None else str(inode))
+        columns['size'].append('' if size is None else str(size))
+        columns['mtime_ns'].append('' if mtime_ns is None else str(mtime_ns))
+        columns['open_time'].append('' if open_ts is None else repr(open_ts))
+        columns['compression'].append(compression)
+        columns['schema'].append(str(schema_index))
+    # One string per column, split in SQL: binding large Python lists is slow
+    sql = f"""
+        SELECT (generate_subscripts(path, 1) - 1)::INTEGER AS file_id, unnest(path) AS path, unnest(log_path) AS log_path,
+               NULLIF(unnest(size), '')::BIGINT AS size,
+               make_timestamp(NULLIF(unnest(mtime_ns), '')::BIGINT // 1000) AS mtime,
+               {convert_seconds("NULLIF(unnest(open_time), '')::DOUBLE", 'time')} AS open_time, unnest(compression) AS compression,
+               schemas[unnest(schema)::INTEGER + 1].fields AS fields, schemas[unnest(schema)::INTEGER + 1].types AS types,
+               NULLIF(unnest(inode), '')::UBIGINT AS inode, NULLIF(unnest(mtime_ns), '')::BIGINT AS mtime_ns
+        FROM (SELECT {', '.join(f"string_split(?, chr(0)) AS {name}" for name in columns)},
+                     from_json(?, '[{{"fields": ["VARCHAR"], "types": ["VARCHAR"]}}]') AS schemas)
+        {'' if files else 'LIMIT 0'}
+    """
+    return sql, (['\0'.join(values) for values in columns.values()]
+                 + [json.dumps([dict(zip(('fields', 'types'), json.loads(key))) for key in schemas])])
+
+def register_files(log_collections):
+    """Creates the log_files table and numbers each schema group's files from info['first_file_id'].
+
+    Each read's files get consecutive ids in read order, so a row's file_id is the read's first id
+    plus DuckDB's file_index. With --files-where, files failing the condition are removed from
+    log_collections first and the remaining files are numbered. With --parquet-cache, the
+    remaining files are then materialized, splitting off reads of the cached copies.
+    """
+    metadata = dict(zip(all_files, scan_results))
+    filtered = materialized = False
+    while True:
+        files = []
+        for log_type, reads in log_collections.items():
+            for info in reads.values():
+                info['first_file_id'] = len(files)
+                files.extend((fname, log_type, metadata[fname]) for fname in info['files'])
+        sql, parameters = select_file_rows(files)
+        con.execute(f"CREATE OR REPLACE TABLE {FILES_TABLE} AS SELECT * EXCLUDE (inode, mtime_ns) FROM ({sql})", parameters)
+        if opts.files_where and not filtered:
+            filtered = True
+            excluded = {path for (path,) in con.execute(f"SELECT path FROM {FILES_TABLE} WHERE ({opts.files_where}) IS NOT TRUE").fetchall()}
+            print(f"[*] Files filter kept {len(files) - len(excluded):,} of {len(files):,} files", file=sys.stderr)
+            if excluded:
+                for log_type in list(log_collections):
+                    reads = log_collections[log_type]
+                    for schema_key in list(reads):
+                        reads[schema_key]['files'] = [fname for fname in reads[schema_key]['files'] if fname not in excluded]
+                        if not reads[schema_key]['files']:
+                            del reads[schema_key]
+                    if not reads:
+                        del log_collections[log_type]
+                continue
+        if opts.parquet_cache and not materialized:
+            materialized = True
+            if materialize_parquet(log_collections):
+                continue  # Cached files moved to reads of their own, so they're numbered again
+        return
+
+def create_views(log_collections):
+    """Creates (or replaces) one view per log type, unioning its schema groups."""
+    register_files(log_collections)
+    for log_type, schemas in log_collections.items():
+        for i, info in enumerate(schemas.values()):
+            # File lists are bound as variables rather than inlined, which keeps the view SQL
+            # small no matter how many files a group holds. Binding a Python list parameter is
+            # far slower than splitting one string, and paths can't contain NUL. Each read gets
+            # its own variable: getvariable() copies a variable's whole value, so indexing one
+            # list of lists per log type makes view creation quadratic in the number of reads
+            if 'parquet' in info:
+                scan_paths = "\0".join(info['parquet'])
+            else:
+                scan_paths = "\0".join(get_scan_path(fname, info['compression']) for fname in info['files'])
+            con.execute(f"SET VARIABLE {sql_identifier(f'zeek_files:{log_type}:{i}')} = string_split(?, chr(0))", [scan_paths])
+            if 'member_ids' in info:
+                for name, key in (('members', 'member_ids'), ('offsets', 'member_offsets')):
+                    con.execute(f"SET VARIABLE {sql_identifier(f'zeek_files:{log_type}:{i}:{name}')} = CAST(json(?) AS INTEGER[])",
+                                [json.dumps(info[key])])
+
+        create_view(log_type, schemas, {})
+        if opts.compact_types and any(STDIN_PATH in info['files'] for info in schemas.values()):
+            # Collecting enum values takes a pass of its own, and standard input can only be read once
+            print(f"[!] Warning: View '{log_type}' reads standard input; not creating ENUM types for it", file=sys.stderr)
+        elif opts.compact_types:
+            enum_types = create_enum_types(log_type, schemas)
+            if enum_types:
+                create_view(log_type, schemas, enum_types)
+        schema_count = sum(info['schemas'] for info in schemas.values())
+        print(f"[*] View '{log_type}' created ({schema_count} schemas detected, {len(schemas)} reads)", file=sys.stderr)
+
+def get_select_builder(info):
+    """Returns the function building the SELECT statement for a schema group's read."""
+    if 'table' in info:
+        return build_table_select
+    if 'parquet' in info:
+        return build_parquet_select
+    return build_json_select if info['reader']['format'] == 'json' else build_schema_select
+
+def create_view(log_type, schemas, enum_types):
+    """Creates (or replaces) the view for log_type from its schema groups' SELECTs."""
+    select_statements = [
+        get_select_builder(info)(info, f"zeek_files:{log_type}:{i}", enum_types)
+        for i, info in enumerate(schemas.values())
+    ]
     # Create a view named after the Zeek #path (e.g., CREATE VIEW conn AS...)
-    view_sql = f"CREATE VIEW \"{log_type}\" AS {' UNION ALL BY NAME '.join(select_statements)}"
+    view_sql = f"CREATE OR REPLACE {'TEMP ' if opts.db else ''}VIEW \"{log_type}\" AS {' UNION ALL BY NAME '.join(select_statements)}"
     con.execute(view_sql)
-    print(f"[*] View '{log_type}' created ({len(schemas)} schemas detected)", file=sys.stderr)
+
+def create_enum_types(log_type, schemas):
+    """Creates an ENUM type for each low-cardinality enum field of log_type's view.
+
+    The values are collected with one pass over the view. Returns {field: enum type name}.
+    """
+    enum_fields = sorted({f for info in schemas.values() for f, t in zip(info['fields'], info['types']) if t == 'enum'})
+    if not enum_fields:
+        return {}
+    # Stop collecting a field's values once it has more than ENUM_MAX_VALUES
+    domains = con.execute(f"""
+        SELECT {', '.join(f'list(DISTINCT "{f}")[:{ENUM_MAX_VALUES + 1}]' for f in enum_fields)} FROM "{log_type}"
+    """).fetchone()
+    enum_types = {}
+    for f, values in zip(enum_fields, domains):
+        values = [value for value in values if value is not None]
+        if len(values) > ENUM_MAX_VALUES:
+            continue
+        type_name = f"zeek_enum:{log_type}:{f}"
+        con.execute(f"DROP TYPE IF EXISTS {sql_identifier(type_name)}")
+        con.execute(f"CREATE {'TEMP ' if opts.db else ''}TYPE {sql_identifier(type_name)} AS ENUM ({', '.join(sql_string(value) for value in sorted(values))})")
+        enum_types[f] = type_name
+    return enum_types
+
+def open_database():
+    """Creates the --db schema, manifest and settings if needed and checks the stored type options.
+
+    Returns {absolute path: (file_id, log type, identity)} for the files already ingested.
+    """
+    layout = json.dumps({'version': DB_VERSION, 'types': sorted(type_map.items())})
+    con.execute(f"CREATE SCHEMA IF NOT EXISTS {DB_SCHEMA}")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.settings (name VARCHAR PRIMARY KEY, value VARCHAR)")
+    con.execute(f"INSERT OR IGNORE INTO {DB_SCHEMA}.settings VALUES ('layout', ?)", [layout])
+    (stored_layout,) = con.execute(f"SELECT value FROM {DB_SCHEMA}.settings WHERE name = 'layout'").fetchone()
+    if stored_layout != layout:
+        # The tables' column types follow --epoch-times and --compact-types
+        print(f"[!] Error: {opts.db} was built by another version or with other type options "
+              f"(--epoch-times, --compact-types); use the same options or a new database", file=sys.stderr)
+        sys.exit(1)
+    sql, parameters = select_file_rows([])
+    con.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.{FILES_TABLE} AS
+        SELECT *, NULL::BIGINT AS rows, NULL::{type_map['time']} AS min_ts, NULL::{type_map['time']} AS max_ts,
+               NULL::TIMESTAMP AS ingested
+        FROM ({sql})
+    """, parameters)
+    return {path: (file_id, log_type, (inode, size, mtime_ns)) for path, file_id, log_type, inode, size, mtime_ns in con.execute(
+        f"SELECT path, file_id, log_path, inode, size, mtime_ns FROM {DB_SCHEMA}.{FILES_TABLE}").fetchall()}
+
+def refresh_database(log_collections):
+    """Appends the rows of files not yet in the --db manifest to their log type's table.
+
+    Files whose identity changed since they were ingested (a log Zeek was still writing, say)
+    have their rows replaced. All of it is one transaction. log_collections is left holding
+    just the files that were read.
+    """
+    ingested = open_database()
+    metadata = dict(zip(all_files, scan_results))
+    (first_file_id,) = con.execute(f"SELECT coalesce(max(file_id) + 1, 0) FROM {DB_SCHEMA}.{FILES_TABLE}").fetchone()
+    next_file_id = first_file_id
+    known = changed = 0
+    t_ingest = time.perf_counter()
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for log_type in list(log_collections):
+            reads = log_collections[log_type]
+            table = f"{DB_SCHEMA}.{sql_identifier(log_type)}"
+            new_files = []
+            selects = []
+            for schema_key in list(reads):
+                info = reads[schema_key]
+                files = []
+                for fname in info['files']:
+                    entry = ingested.get(absolute_path(fname))
+                    if entry and entry[2] == metadata[fname][0]:
+                        known += 1
+                        continue
+                    if entry:
+                        changed += 1
+                        con.execute(f"DELETE FROM {DB_SCHEMA}.{sql_identifier(entry[1])} WHERE file_id = ?", [entry[0]])
+                        con.execute(f"DELETE FROM {DB_SCHEMA}.{FILES_TABLE} WHERE file_id = ?", [entry[0]])
+                    files.append(fname)
+                if not files:
+                    del reads[schema_key]
+                    continue
+                info.update(files=files, first_file_id=next_file_id + len(new_files))
+                files_variable = f"zeek_ingest:{log_type}:{len(selects)}"
+                scan_paths = "\0".join(get_scan_path(fname, info['compression']) for fname in files)
+                con.execute(f"SET VARIABLE {sql_identifier(files_variable)} = string_split(?, chr(0))", [scan_paths])
+                selects.append(get_select_builder(info)(info, files_variable, {}, for_cache=True))
+                # The manifest records the types the rows were read with (see align_json_schemas())
+                group_types = dict(zip(info['fields'], info['types']))
+                for fname in files:
+                    identity, (l_path, f_list, _, open_ts, compression, reader), hit = metadata[fname]
+                    header = (l_path, f_list, [group_types[f] for f in f_list], open_ts, compression, reader)
+                    new_files.append((absolute_path(fname), log_type, (identity, header, hit)))
+            if not selects:
+                del log_collections[log_type]
+                continue
+
+            # New fields (a Zeek upgrade, say) become new columns, NULL in the rows already stored
+            select = ' UNION ALL BY NAME '.join(selects)
+            columns = [(name, column_type) for name, column_type, *_ in con.execute(f"DESCRIBE {select}").fetchall()]
+            existing = {name for (name,) in con.execute(
+                "SELECT column_name FROM duckdb_columns() WHERE database_name = current_database() AND schema_name = ? AND table_name = ?",
+                [DB_SCHEMA, log_type]).fetchall()}
+            if not existing:
+                con.execute(f"CREATE TABLE {table} ({', '.join(f'{sql_identifier(name)} {column_type}' for name, column_type in columns)})")
+            for name, column_type in columns:
+                if existing and name not in existing:
+                    con.execute(f"ALTER TABLE {table} ADD COLUMN {sql_identifier(name)} {column_type}")
+            # Rows go in file order, unsorted: files are read in path order, which for Zeek's rotated
+            # archives is time order, so row groups already span short ts ranges for the zone maps.
+            # Sorting would hold the whole batch in memory (5x the peak RSS on a first ingestion)
+            after_scan = last_reject_scan()
+            con.execute(f"INSERT INTO {table} BY NAME {select}")
+            check_malformed_rows(after_scan)
+            has_ts = any(name == 'ts' for name, _ in columns) or 'ts' in existing
+
+            sql, parameters = select_file_rows(new_files)
+            ts_range = 'min("ts") AS min_ts, max("ts") AS max_ts' if has_ts else 'NULL AS min_ts, NULL AS max_ts'
+            con.execute(f"""
+                INSERT INTO {DB_SCHEMA}.{FILES_TABLE} BY NAME
+                SELECT f.* REPLACE (f.file_id + {next_file_id} AS file_id), coalesce(s.rows, 0) AS rows, s.min_ts, s.max_ts,
+                       make_timestamp(?) AS ingested
+                FROM ({sql}) f LEFT JOIN (
+                    SELECT file_id, count(*) AS rows, {ts_range} FROM {table} WHERE file_id >= {next_file_id} GROUP BY file_id
+                ) s ON s.file_id = f.file_id + {next_file_id}
+            """, [time.time_ns() // 1000] + parameters)
+            next_file_id += len(new_files)
+        con.execute("COMMIT")
+    except duckdb.Error as e:
+        con.execute("ROLLBACK")
+        print(f"[!] Error: Could not ingest into {opts.db}, which is unchanged: {e}", file=sys.stderr)
+        sys.exit(1)
+    (rows,) = con.execute(f"SELECT coalesce(sum(rows), 0) FROM {DB_SCHEMA}.{FILES_TABLE} WHERE file_id >= {first_file_id}").fetchone()
+    print(f"[*] Database: ingested {next_file_id - first_file_id:,} files ({rows:,} rows) in {time.perf_counter() - t_ingest:.2f}s; "
+          f"{known:,} unchanged files skipped, {changed:,} changed files replaced", file=sys.stderr)
+
+def create_database_views():
+    """Creates a temporary view over each log type's table in the --db database, and the log_files view.
+
+    Returns the views' groups, shaped like log_collections: {log type: {'table': info}}.
+    """
+    con.execute(f"CREATE OR REPLACE TEMP VIEW {FILES_TABLE} AS SELECT * EXCLUDE (inode, mtime_ns) FROM {DB_SCHEMA}.{FILES_TABLE}")
+    field_types = {}
+    files = {}
+    for log_type, fields, types, rows in con.execute(
+            f"SELECT log_path, fields, types, rows FROM {DB_SCHEMA}.{FILES_TABLE} ORDER BY file_id").fetchall():
+        for f, t in zip(fields, types):
+            field_types.setdefault(log_type, {}).setdefault(f, t)
+        file_count, row_count = files.get(log_type, (0, 0))
+        files[log_type] = (file_count + 1, row_count + rows)
+    views = {}
+    for log_type, columns in con.execute("""
+        SELECT table_name, list(column_name ORDER BY column_index) FROM duckdb_columns()
+        WHERE database_name = current_database() AND schema_name = ? AND table_name NOT IN (?, 'settings')
+        GROUP BY ALL ORDER BY ALL
+    """, [DB_SCHEMA, FILES_TABLE]).fetchall():
+        fields = [f for f in columns if f != 'file_id']
+        # Every column came from some file's header; the manifest says which Zeek type it had
+        types = [field_types.get(log_type, {}).get(f, 'string') for f in fields]
+        schemas = {'table': {'table': log_type, 'fields': fields, 'types': types, 'stored_fields': fields}}
+        create_view(log_type, schemas, {})
+        if opts.compact_types:
+            enum_types = create_enum_types(log_type, schemas)
+            if enum_types:
+                create_view(log_type, schemas, enum_types)
+        file_count, row_count = files.get(log_type, (0, 0))
+        print(f"[*] View '{log_type}' reads {DB_SCHEMA}.{log_type} ({file_count:,} files, {row_count:,} rows)", file=sys.stderr)
+        views[log_type] = schemas
+    return views
+
+def find_header_mismatches(log_collections):
+    """Returns the assumed-header files whose #fields/#types lines, as seen by the scan, differ or are missing."""
+    expected = {}
+    read_of = {}
+    for schemas in log_collections.values():
+        for info in schemas.values():
+            if not info['verify'] or info['reader']['format'] != 'tsv':
+                continue
+            separator, types_line = info['reader']['separator'], info['reader']['header_lines']
+            header_lines = {
+                types_line - 1: separator.join(['#fields'] + info['fields']),
+                types_line: separator.join(['#types'] + info['types']),
+            }
+            for fname in info['files']:
+                path = get_scan_path(fname, info['compression'])
+                read_of[path] = id(info)
+                if fname in assumed_files:
+                    expected[path] = (fname, header_lines)
+    line_numbers = sorted({line for _, header_lines in expected.values() for line in header_lines})
+    try:
+        scanned = {path for (path,) in con.execute("SELECT DISTINCT file_path FROM reject_scans").fetchall()}
+        seen = {(path, line): csv_line for path, line, csv_line in con.execute(f"""
+            SELECT DISTINCT s.file_path, e.line, e.csv_line
+            FROM reject_errors e JOIN reject_scans s USING (scan_id, file_id)
+            WHERE e.line IN ({', '.join(map(str, line_numbers or [0]))})
+        """).fetchall()}
+    except duckdb.CatalogException:
+        return set()  # The query didn't scan any group with assumed headers
+    # reject_scans only lists files with rejected lines, and a file read from its #fields line
+    # always rejects its header. A file missing there in a group the query read either wasn't
+    # opened or lacks the assumed header (a JSON log taken for TSV, say): either way it's flagged.
+    # Groups none of whose files are listed were never read, so they need no verification
+    scanned_reads = {read_of[path] for path in scanned if path in read_of}
+    return {
+        fname for path, (fname, header_lines) in expected.items()
+        if read_of[path] in scanned_reads and any(seen.get((path, line)) != text for line, text in header_lines.items())
+    }
+
+def last_reject_scan():
+    """Returns the highest scan_id recorded in reject_scans so far, or -1 if there is none."""
+    try:
+        return con.execute("SELECT coalesce(max(scan_id), -1) FROM reject_scans").fetchone()[0]
+    except duckdb.CatalogException:
+        return -1
+
+def is_in_progress_line(path, csv_line):
+    """Returns whether csv_line is the half-written last line of the plain log at path.
+
+    The line is looked for in the file's last IN_PROGRESS_TAIL_BYTES. It's in progress unless a
+    newline follows it, which also covers a line that Zeek finished since the scan read it.
+    """
+    try:
+        with open(path, 'rb') as f:
+            start = max(0, f.seek(0, os.SEEK_END) - IN_PROGRESS_TAIL_BYTES)
+            f.seek(start)
+            tail = f.read()
+    except OSError:
+        return False  # S3 objects and streamed reads are never written to while queried
+    line = csv_line.encode()
+    position = tail.rfind(b'\n' + line) + 1
+    if not position and not (start == 0 and tail.startswith(line)):
+        return False
+    return tail[position + len(line):position + len(line) + 1] != b'\n'
+
+def in_progress_filter(after_scan):
+    """Returns an SQL condition on reject_errors e / reject_scans s leaving out half-written last lines.
+
+    Zeek appends to current/*.log while it runs, so the last line a scan reads from a plain log
+    can be unterminated. It's rejected for its missing columns, but isn't malformed.
+    """
+    try:
+        last_rejects = con.execute("""
+            SELECT s.file_path, max(e.line), arg_max(e.csv_line, e.line)
+            FROM reject_errors e JOIN reject_scans s USING (scan_id, file_id)
+            WHERE e.scan_id > ? AND e.csv_line NOT LIKE '#%' AND s.file_path NOT LIKE 'zeekcodec://%'
+            GROUP BY ALL
+        """, [after_scan]).fetchall()
+    except duckdb.CatalogException:
+        return "true"
+    return " AND ".join([f"NOT (s.file_path = {sql_string(path)} AND e.line = {line})"
+                         for path, line, csv_line in last_rejects if is_in_progress_line(path, csv_line)] or ["true"])
+
+def check_malformed_rows(after_scan):
+    """Without --tolerant, fails on rows that reads after scan after_scan rejected as malformed.
+
+    TSV reads skip malformed rows into reject_errors rather than failing (see build_schema_select()),
+    so strict mode checks for them once the statement has run. Raises duckdb.InvalidInputException.
+    """
+    if opts.tolerant:
+        return
+    try:
+        rejected = con.execute(f"""
+            SELECT count(DISTINCT (s.file_path, e.line)), arg_min((s.file_path, e.line, e.error_type, e.csv_line), (s.file_path, e.line))
+            FROM reject_errors e JOIN reject_scans s USING (scan_id, file_id)
+            WHERE e.scan_id > ? AND e.csv_line NOT LIKE '#%' AND {in_progress_filter(after_scan)}
+        """, [after_scan]).fetchone()
+    except duckdb.CatalogException:
+        return  # No read has recorded rejects
+    count, first = rejected
+    if count:
+        path, line, error_type, csv_line = first
+        raise duckdb.InvalidInputException(
+            f"{count:,} malformed rows, the first in {path} on line {line} ({error_type}): {csv_line!r}. "
+            f"Use --tolerant to skip them")
+
+def report_rejected_rows(log_collections):
+    """Prints how many rows the scan skipped as malformed, and why, per log type and file.
+
+    Uses the reject_errors/reject_scans tables filled by reads with store_rejects. Header
+    and trailer lines are rejected by design and not counted, nor is a live log's half-written
+    last line (see in_progress_filter()).
+    """
+    files = {}
+    for log_type, schemas in log_collections.items():
+        for info in schemas.values():
+            if info['reader']['format'] == 'tsv':
+                for fname in info['files']:
+                    files[get_scan_path(fname, info['compression'])] = (log_type, fname)
+    try:
+        # A row can be rejected by several reads of the same file (self-joins, --compact-types)
+        # and with several errors, so rows are counted by line
+        rejected = con.execute(f"""
+            SELECT file_path, reason, count(*) FROM (
+                SELECT s.file_path, e.line, min(e.error_type || CASE WHEN e.error_type = 'CAST' THEN ' ' || e.column_name ELSE '' END) AS reason
+                FROM reject_errors e JOIN reject_scans s USING (scan_id, file_id)
+                WHERE e.csv_line NOT LIKE '#%' AND {in_progress_filter(-1)}
+                GROUP BY ALL
+            ) GROUP BY ALL ORDER BY ALL
+        """).fetchall()
+    except duckdb.CatalogException:
+        return  # The query didn't scan any read that records rejects
+    by_log_type = {}
+    for path, reason, count in rejected:
+        log_type, fname = files.get(path, ('?', path))
+        by_file = by_log_type.setdefault(log_type, {})
+        by_file.setdefault(fname, {})[reason] = count
+    for log_type, by_file in sorted(by_log_type.items()):
+        reasons = {}
+        for file_reasons in by_file.values():
+            for reason, count in file_reasons.items():
+                reasons[reason] = reasons.get(reason, 0) + count
+        print(f"[!] Warning: skipped {sum(reasons.values()):,} malformed rows in '{log_type}' "
+              f"({', '.join(f'{reason}: {count:,}' for reason, count in sorted(reasons.items()))})", file=sys.stderr)
+        ranked = sorted(by_file.items(), key=lambda item: -sum(item[1].values()))
+        for fname, file_reasons in ranked[:REJECTED_FILES_SHOWN]:
+            print(f"      {fname}: {sum(file_reasons.values()):,} rows "
+                  f"({', '.join(f'{reason}: {count:,}' for reason, count in sorted(file_reasons.items()))})", file=sys.stderr)
+        if len(ranked) > REJECTED_FILES_SHOWN:
+            print(f"      ... and {len(ranked) - REJECTED_FILES_SHOWN:,} more files", file=sys.stderr)
+
+def replan_sample_groups(mismatched_files):
+    """Reads the real header of every assumed file in the sample groups of mismatched_files."""
+    groups = {get_sample_group(fname) for fname in mismatched_files}
+    positions = [i for i, fname in enumerate(all_files) if fname in assumed_files and get_sample_group(fname) in groups]
+    replanned_files = [all_files[i] for i in positions]
+    replanned_results = scan_files(replanned_files)
+    for i, result in zip(positions, replanned_results):
+        scan_results[i] = result
+        assumed_files.discard(all_files[i])
+    # Cache the headers just read so the next run looks them up rather than sampling again
+    update_metadata_cache(replanned_files, replanned_results)
+    return len(groups)
+
+def configure_httpfs():
+    """Lets DuckDB read s3:// paths with httpfs, using the same credentials and endpoint as discovery.
+
+    Without httpfs, objects are streamed through DecompressingFileSystem with ranged GETs instead.
+    """
+    global httpfs_loaded
+    try:
+        con.execute("INSTALL httpfs")
+        con.execute("LOAD httpfs")
+    except duckdb.Error as e:
+        if fsspec is None:
+            print(f"[!] Error: S3 objects need DuckDB's httpfs extension or the 'fsspec' package: {e}", file=sys.stderr)
+            sys.exit(1)
+        print("[!] Warning: DuckDB's httpfs extension is unavailable; streaming S3 objects through Python", file=sys.stderr)
+        return
+    secret = {'TYPE': 's3', 'REGION': sql_string(s3_region)}
+    if os.environ.get('AWS_ACCESS_KEY_ID') and os.environ.get('AWS_SECRET_ACCESS_KEY'):
+        secret['KEY_ID'] = sql_string(os.environ['AWS_ACCESS_KEY_ID'])
+        secret['SECRET'] = sql_string(os.environ['AWS_SECRET_ACCESS_KEY'])
+        if os.environ.get('AWS_SESSION_TOKEN'):
+            secret['SESSION_TOKEN'] = sql_string(os.environ['AWS_SESSION_TOKEN'])
+    if opts.s3_endpoint:
+        endpoint = urllib.parse.urlsplit(opts.s3_endpoint)
+        secret.update({'ENDPOINT': sql_string(endpoint.netloc + endpoint.path.rstrip('/')), 'URL_STYLE': "'path'",
+                       'USE_SSL': 'true' if endpoint.scheme == 'https' else 'false'})
+    con.execute(f"CREATE OR REPLACE SECRET zeek_s3 ({', '.join(f'{key} {value}' for key, value in secret.items())})")
+    httpfs_loaded = True
+
+if any(is_s3_path(fname) for fname in all_files):
+    configure_httpfs()
+if opts.db:
+    refresh_database(log_collections)
+    log_views = create_database_views()
+else:
+    create_views(log_collections)
+    log_views = log_collections
 
 t_view = time.perf_counter() - t0
 print(f"[*] All views initialized in {t_view:.4f}s\n", file=sys.stderr)
 
+def get_address_range(value):
+    """Returns (family, low, high) in zeek_ip_int() terms for an address or CIDR string, or None."""
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+    offset = 0xffff00000000 if network.version == 4 else 0
+    return network.version, offset + int(network.network_address), offset + int(network.broadcast_address)
+
+def rewrite_address_predicates(sql, log_collections):
+    """Rewrites INET equality and <<=/>>= predicates on addr fields into <field>_int range tests.
+
+    Works on DuckDB's own parse tree (json_serialize_sql/json_deserialize_sql). Returns sql
+    unchanged if it can't be parsed or nothing was rewritten.
+    """
+    addr_fields = {f for schemas in log_collections.values() for info in schemas.values()
+                   for f, t in zip(info['fields'], info['types']) if t == 'addr'}
+    parse = lambda text: json.loads(con.execute("SELECT json_serialize_sql(?)", [text]).fetchone()[0])
+    try:
+        tree = parse(sql)
+    except duckdb.Error:
+        return sql
+    if tree.get('error'):
+        return sql
+
+    def address_column(node):
+        if node.get('class') == 'COLUMN_REF' and node['column_names'][-1] in addr_fields:
+            return node['column_names']
+        return None
+
+    def address_constant(node):
+        # INET '10.0.0.0/8', CAST('...' AS INET) or a bare string compared with an addr field
+        if node.get('class') == 'CAST' and (node['cast_type'].get('type_info') or {}).get('name', '').upper() == 'INET':
+            node = node['child']
+        if node.get('class') == 'CONSTANT' and node['value']['type']['id'] == 'VARCHAR' and not node['value']['is_null']:
+            return get_address_range(node['value']['value'])
+        return None
+
+    def range_test(column_names, address_range, exact):
+        family, low, high = address_range
+        column = lambda suffix: '.'.join([sql_identifier(name) for name in column_names[:-1]] + [sql_identifier(column_names[-1] + suffix)])
+        if exact:
+            test = f"{column('_int')} = CAST('{low}' AS UHUGEINT)"
+        else:
+            test = f"{column('_int')} BETWEEN CAST('{low}' AS UHUGEINT) AND CAST('{high}' AS UHUGEINT)"
+        if family == 6:
+            test = f"{column('_family')} = 6 AND {test}"
+        return parse(f"SELECT ({test})")['statements'][0]['node']['select_list'][0]
+
+    def rewrite(node):
+        if isinstance(node, list):
+            return [rewrite(child) for child in node]
+        if not isinstance(node, dict):
+            return node
+        if node.get('class') == 'FUNCTION' and node.get('function_name') in ('<<=', '>>=') and len(node['children']) == 2:
+            # a <<= b: a is contained in b; a >>= b: a contains b
+            inner, outer = node['children'] if node['function_name'] == '<<=' else node['children'][::-1]
+            column_names, address_range = address_column(inner), address_constant(outer)
+            if column_names and address_range:
+                return range_test(column_names, address_range, exact=False)
+        if node.get('type') == 'COMPARE_EQUAL':
+            for left, right in ((node['left'], node['right']), (node['right'], node['left'])):
+                column_names, address_range = address_column(left), address_constant(right)
+                # Equality on an INET with a prefix length also compares the mask, so only hosts
+                if column_names and address_range and address_range[1] == address_range[2]:
+                    return range_test(column_names, address_range, exact=True)
+        return {key: rewrite(value) for key, value in node.items()}
+
+    rewritten = rewrite(tree)
+    if rewritten == tree:
+        return sql
+    return con.execute("SELECT json_deserialize_sql(?::JSON)", [json.dumps(rewritten)]).fetchone()[0]
+
+query_sql = rewrite_address_predicates(user_query, log_views) if opts.ip_ints else user_query
+if query_sql != user_query:
+    print(f"[*] Rewrote address predicates into integer ranges: {query_sql}", file=sys.stderr)
+
 # 4. Execution & Streaming
 print(f"--- Streaming Results ---\n", file=sys.stderr, flush=True)
 t0 = time.perf_counter()
 row_count = 0
 
 try:
-    res = con.execute(user_query)
-    print("\t".join([d[0] for d in res.description]), flush=True)
-    
+    after_scan = last_reject_scan()
     while True:
-        chunk = res.fetchmany(1000)
-        if not chunk: break
+        try:
+            res = con.execute(query_sql)
+            # Sampled headers are only confirmed once the scan has read every file's own header
+            # lines, so hold the result until then and re-run on corrected views if any differ
+            chunks = [res.fetchall()] if assumed_files else None
+            break
+        except duckdb.BinderException:
+            if not assumed_files:
+                raise
+            # The query names a column missing from the sampled headers, which a file assumed to
+            # match might still have: read every assumed header and plan exactly instead
+            replanned = replan_sample_groups(set(assumed_files))
+            print(f"[*] Header sampling: query did not bind on sampled schemas; re-planned {replanned:,} groups", file=sys.stderr)
+        except duckdb.InvalidInputException:
+            json_files = {fname for schemas in log_collections.values() for info in schemas.values()
+                          if info['verify'] and info['reader']['format'] == 'json'
+                          for fname in info['files'] if fname in assumed_files}
+            if not json_files:
+                raise
+            # read_json failed on a file assumed to be JSON like its group's sample, which may be a
+            # TSV log (Zeek's two writers can share a directory): read those groups' headers instead
+            replanned = replan_sample_groups(json_files)
+            print(f"[*] Header sampling: a JSON read failed on assumed headers; re-planned {replanned:,} groups", file=sys.stderr)
+        log_collections, _ = build_log_collections(all_files, scan_results)
+        create_views(log_collections)
+        after_scan = last_reject_scan()
+    if chunks is not None:
+        description = res.description
+        mismatched_files = find_header_mismatches(log_collections)
+        while mismatched_files:
+            replanned = replan_sample_groups(mismatched_files)
+            print(f"[*] Header sampling: {len(mismatched_files):,} files did not match their group's header; "
+                  f"re-planned {replanned:,} groups", file=sys.stderr)
+            log_collections, _ = build_log_collections(all_files, scan_results)
+            create_views(log_collections)
+            con.execute("DROP TABLE IF EXISTS reject_errors")
+            con.execute("DROP TABLE IF EXISTS reject_scans")
+            after_scan = last_reject_scan()
+            res = con.execute(query_sql)
+            chunks = [res.fetchall()]
+            description = res.description
+            mismatched_files = find_header_mismatches(log_collections)
+    else:
+        description = res.description
+        chunks = iter(lambda: res.fetchmany(1000), [])
+    print("\t".join([d[0] for d in description]), flush=True)
+    
+    for chunk in chunks:
         for row in chunk:
             # Convert values to match Zeek log format: None -> '-', False -> 'F', True -> 'T'
             # Also convert INET types (dictionaries) to IP address strings
@@ -293,8 +2788,18 @@ try:
                     formatted_row.append(str(val))
             print("\t".join(formatted_row), flush=True)
             row_count += 1
+    # The scan only settles which rows it rejected once it's done, so without --tolerant a
+    # malformed row fails the query after the rows before it were streamed
+    check_malformed_rows(after_scan)
             
     print(f"\n--- Summary ---", file=sys.stderr)
     print(f"Total Rows:  {row_count:,}\tQuery Time: {time.perf_counter()-t0:.4f}s", file=sys.stderr)
+    report_rejected_rows(log_collections)
+    report_s3_requests("query scan" if not httpfs_loaded else "query scan, excluding httpfs")
+    if stdin_stream is not None and stdin_stream.skipped_rows:
+        print(f"[!] Warning: stdin: skipped rows of log types other than the first header's: "
+              f"{', '.join(f'{path}: {rows:,}' for path, rows in sorted(stdin_stream.skipped_rows.items()))}",
+              file=sys.stderr)
 except Exception as e:
-    print(f"\nSQL Error: {e}", file=sys.stderr)
\ No newline at end of file
+    print(f"\nSQL Error: {e}", file=sys.stderr)
+    sys.exit(1)  # Rows may already be on stdout, so the status is what tells a pipeline they're incomplete
\ No newline at end of file